@@ -0,0 +1,12 @@
+import pytest
+from django.test.utils import override_settings
+
+from core.cache import isolated_caches
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_cache(tmp_path_factory):
+    """Кеш тестов во временном каталоге, а не в CACHE_DIR сервера."""
+    directory = tmp_path_factory.mktemp('cache')
+    with override_settings(CACHES=isolated_caches(str(directory))):
+        yield
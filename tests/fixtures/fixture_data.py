@@ -9,6 +9,9 @@ from posts.models import Post, Group
 def mock_media(settings):
     with tempfile.TemporaryDirectory() as temp_directory:
         settings.MEDIA_ROOT = temp_directory
+        # Миниатюры создаются сразу: фоновый поток не должен писать
+        # во временную папку, пока её удаляют.
+        settings.THUMBNAIL_WORKERS = 0
         yield temp_directory
 
 
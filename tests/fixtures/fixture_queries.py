@@ -0,0 +1,22 @@
+import pytest
+from django.core.cache import cache
+
+from core.testing import constant_queries_report
+
+
+@pytest.fixture
+def assert_constant_queries(db):
+    """Проверка, что число запросов на страницу не зависит от объёма данных.
+
+    Принимает `render()` — запрос к странице и `grow(n)` — функцию,
+    доводящую данные до n объектов.
+    """
+    def check(render, grow, sizes=(1, 5)):
+        def render_without_cache():
+            cache.clear()
+            render()
+
+        report = constant_queries_report(render_without_cache, grow, sizes)
+        assert report is None, report
+
+    return check
@@ -0,0 +1,30 @@
+import pytest
+
+from posts.models import Comment, Post
+
+
+class TestQueryBudget:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_index_queries_do_not_depend_on_posts(
+            self, client, mixer, user, group, assert_constant_queries):
+        def grow(size):
+            missing = size - Post.objects.count()
+            if missing > 0:
+                mixer.cycle(missing).blend(
+                    Post, author=user, group=group, image=''
+                )
+
+        assert_constant_queries(lambda: client.get('/'), grow)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_post_detail_queries_do_not_depend_on_comments(
+            self, client, mixer, post, assert_constant_queries):
+        def grow(size):
+            missing = size - post.comments.count()
+            if missing > 0:
+                mixer.cycle(missing).blend(Comment, post=post)
+
+        assert_constant_queries(
+            lambda: client.get(f'/posts/{post.id}/'), grow
+        )
@@ -0,0 +1,264 @@
+"""Двухуровневый кеш: LRU в памяти процесса поверх общего кеша.
+
+L1 — небольшой LocMemCache каждого процесса, L2 — кеш, общий для всех
+процессов (алиас из LOCATION, например FileBasedCache). Записи идут в
+оба уровня, а ключи изменённых записей публикуются в канал сброса —
+файл, куда процессы дописывают строки. Перед каждым обращением
+процесс дочитывает канал и удаляет чужие изменённые ключи из своего
+L1. Если файл канала начат заново, L1 очищается целиком.
+
+Время жизни записи в L1 дополнительно ограничено L1_TIMEOUT: это
+страховка на случай сообщения, потерянного при ротации канала.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'CHANNEL': '/path/to/invalidations.log'},
+        },
+        'shared': {...},
+    }
+"""
+import copy
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+MISSING = object()
+
+# Django создаёт бэкенд кеша на каждый поток, а L1 (LocMemCache с тем же
+# именем) и позиция в канале общие на процесс.
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+class InvalidationChannel:
+    """Журнал изменённых ключей в файле, общем для процессов."""
+
+    def __init__(self, path, max_size=1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self._inode = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def publish(self, keys):
+        """Сообщает другим процессам об изменении ключей.
+
+        Ключ — пара (key, version); None вместо пар означает clear().
+        """
+        pid = os.getpid()
+        if keys is None:
+            data = json.dumps([pid, None, None]) + '\n'
+        else:
+            data = ''.join(
+                json.dumps([pid, key, version]) + '\n'
+                for key, version in keys
+            )
+        if not data:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Короткая запись с O_APPEND не перемешивается с чужими.
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode())
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_size:
+            self._rotate()
+
+    def _rotate(self):
+        fresh = '%s.%s' % (self.path, os.getpid())
+        open(fresh, 'wb').close()
+        os.replace(fresh, self.path)
+
+    def poll(self):
+        """Ключи, изменённые другими процессами с прошлого вызова.
+
+        None — журнал начат заново или был clear(): L1 надо очистить.
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._inode, self._offset = 0, 0
+                return []
+            if self._inode is None:
+                # Первый вызов: всё записанное раньше к нам не относится.
+                self._inode, self._offset = stat.st_ino, stat.st_size
+                return []
+            if self._inode == 0:
+                # Файла не было, читаем его с начала.
+                self._inode = stat.st_ino
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._inode, self._offset = stat.st_ino, stat.st_size
+                return None
+            if stat.st_size == self._offset:
+                return []
+            with open(self.path, 'rb') as log:
+                log.seek(self._offset)
+                data = log.read(stat.st_size - self._offset)
+            # Недописанную строку дочитаем в следующий раз.
+            data = data[:data.rfind(b'\n') + 1]
+            self._offset += len(data)
+
+        pid = os.getpid()
+        keys = []
+        for line in data.decode().splitlines():
+            sender, key, version = json.loads(line)
+            if sender == pid:
+                continue
+            if key is None:
+                return None
+            keys.append((key, version))
+        return keys
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        path = options['CHANNEL']
+        self._shared_alias = location
+        self._local_timeout = options.get('L1_TIMEOUT', 60)
+        # L1 привязан к каналу: кеши из разных каталогов (например,
+        # тестовый) не делят память процесса.
+        self._local = LocMemCache('tiered-%s-%s' % (location, path), {
+            'TIMEOUT': self._local_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000)},
+        })
+        with _channels_lock:
+            if path not in _channels:
+                _channels[path] = InvalidationChannel(
+                    path, options.get('CHANNEL_MAX_SIZE', 1024 * 1024))
+                _channels[path].poll()
+        self._channel = _channels[path]
+        self._poll_interval = options.get('POLL_INTERVAL', 0)
+        self._polled = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _timeout_l1(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._polled < self._poll_interval:
+            return
+        self._polled = now
+        keys = self._channel.poll()
+        if keys is None:
+            self._local.clear()
+            return
+        for key, version in keys:
+            self._local.delete(key, version=version)
+
+    def _changed(self, keys, version):
+        self._channel.publish([(key, version) for key in keys])
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        value = self._local.get(key, MISSING, version=version)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            return default
+        self._local.set(key, value, self._local_timeout, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        keys = list(keys)
+        found = self._local.get_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            if fetched:
+                self._local.set_many(
+                    fetched, self._local_timeout, version=version)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        self._sync()
+        return (
+            self._local.has_key(key, version=version)
+            or self.shared.has_key(key, version=version)
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local.set(
+                key, value, self._timeout_l1(timeout), version=version)
+            self._changed([key], version)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local.set(key, value, self._timeout_l1(timeout), version=version)
+        self._changed([key], version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version) or []
+        self._local.set_many(data, self._timeout_l1(timeout), version=version)
+        self._changed(data, version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # Срок в L1 короче общего, поэтому просто перечитаем запись.
+        self._local.delete(key, version=version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._local.set(key, value, self._local_timeout, version=version)
+        self._changed([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._local.delete(key, version=version)
+        self._changed([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        self._local.delete_many(keys, version=version)
+        self._changed(keys, version)
+
+    def clear(self):
+        self.shared.clear()
+        self._local.clear()
+        self._channel.publish(None)
+
+
+def isolated_caches(directory):
+    """settings.CACHES, перенесённые в `directory`.
+
+    Файловые кеши и каналы сброса получают свои файлы в `directory`:
+    тесты и замеры не трогают кеш запущенного сервера и друг друга.
+    """
+    config = copy.deepcopy(settings.CACHES)
+    for alias, params in config.items():
+        if params['BACKEND'].endswith('.FileBasedCache'):
+            params['LOCATION'] = os.path.join(directory, alias)
+        options = params.get('OPTIONS', {})
+        if 'CHANNEL' in options:
+            options['CHANNEL'] = os.path.join(
+                directory, os.path.basename(options['CHANNEL']))
+    return config
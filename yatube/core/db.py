@@ -0,0 +1,101 @@
+"""Чтение с реплики базы данных для view, которые ничего не пишут.
+
+View с декоратором `use_replica` читает из алиаса `replica`, все
+записи идут в `default`. Реплика может отставать, поэтому
+пользователь, который только что что-то записал (`stick_to_primary`),
+REPLICA_LAG секунд читает из `default` и сразу видит свои изменения.
+
+Реплика, которая указывает на ту же базу, что и `default` (так
+настроено локально, а в тестах это зеркало), не используется.
+
+    DATABASES = {
+        'default': {...},
+        'replica': {..., 'TEST': {'MIRROR': 'default'}},
+    }
+    DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+DEFAULT = 'default'
+REPLICA = 'replica'
+STICKY_KEY = 'replica:sticky:{}'
+
+_state = threading.local()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный с реплики, сохраняется в основную базу.
+        return DEFAULT
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT, REPLICA}
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
+
+
+def replica_alias():
+    """Алиас реплики или None, если реплики нет."""
+    databases = connections.databases
+    if REPLICA not in databases:
+        return None
+    if databases[REPLICA]['NAME'] == databases[DEFAULT]['NAME']:
+        return None
+    return REPLICA
+
+
+@contextmanager
+def replica_reads(alias=REPLICA):
+    """Чтения внутри блока идут в alias."""
+    previous = getattr(_state, 'alias', None)
+    _state.alias = alias
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+def stick(user):
+    if user.is_authenticated:
+        cache.set(STICKY_KEY.format(user.pk), True, settings.REPLICA_LAG)
+
+
+def is_sticky(user):
+    return user.is_authenticated and bool(
+        cache.get(STICKY_KEY.format(user.pk)))
+
+
+def use_replica(view):
+    """GET и HEAD читают с реплики, если пользователь недавно ничего
+    не записывал, а страница не меняла данные (`request.replica_allowed`
+    ставят обёртки, знающие, от чего зависит страница)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = replica_alias()
+        if (alias is None or request.method not in ('GET', 'HEAD')
+                or not getattr(request, 'replica_allowed', True)
+                or is_sticky(request.user)):
+            return view(request, *args, **kwargs)
+        with replica_reads(alias):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def stick_to_primary(view):
+    """View, которое пишет: после него пользователь читает из default."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        stick(request.user)
+        return response
+    return wrapper
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas, is_busy, retry_delay
+from core.stats import percentile
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, pub_date REAL, '
+    'text TEXT, comments_count INTEGER DEFAULT 0)',
+    'CREATE INDEX post_date ON post (pub_date DESC, id DESC)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'created REAL, text TEXT)',
+    'CREATE INDEX comment_post ON comment (post_id, created)',
+)
+READ_FEED = (
+    'SELECT id, text, comments_count FROM post '
+    'ORDER BY pub_date DESC, id DESC LIMIT 10'
+)
+READ_COMMENTS = (
+    'SELECT id, text FROM comment WHERE post_id = ? ORDER BY created'
+)
+
+
+def connect(path, pragmas):
+    connection = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(connection.cursor(), pragmas)
+    return connection
+
+
+def read_worker(path, pragmas, deadline, queue):
+    connection = connect(path, pragmas)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            posts = connection.execute(READ_FEED).fetchall()
+            connection.execute(READ_COMMENTS, [posts[0][0]]).fetchall()
+        except sqlite3.OperationalError as error:
+            if not is_busy(error):
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    queue.put(('read', latencies, 0, errors))
+
+
+def write_comment(connection):
+    # Как add_comment: deferred-транзакция сначала читает, потом пишет.
+    connection.execute('BEGIN')
+    try:
+        post_id = connection.execute(
+            'SELECT id FROM post ORDER BY pub_date DESC LIMIT 1'
+        ).fetchone()[0]
+        connection.execute(
+            'INSERT INTO comment (post_id, created, text) VALUES (?, ?, ?)',
+            [post_id, time.time(), 'Ок'])
+        connection.execute(
+            'UPDATE post SET comments_count = comments_count + 1 '
+            'WHERE id = ?', [post_id])
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+
+
+def write_worker(path, pragmas, deadline, queue, retries):
+    """Повторяет транзакцию, как retry_on_busy в пишущих view."""
+    connection = connect(path, pragmas)
+    latencies, retried, errors = [], 0, 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                write_comment(connection)
+            except sqlite3.OperationalError as error:
+                if not is_busy(error):
+                    raise
+                if attempt == retries:
+                    errors += 1
+                else:
+                    retried += 1
+                    time.sleep(retry_delay(attempt))
+            else:
+                latencies.append(time.perf_counter() - started)
+                break
+    connection.close()
+    queue.put(('write', latencies, retried, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при одновременном '
+        'чтении и записи: настройки по умолчанию и SQLITE_PRAGMAS. '
+        'Работает на временной базе, а не на базе проекта.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--posts', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            for number, (name, pragmas) in enumerate((
+                ('по умолчанию', {}),
+                ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+            )):
+                # Своя база для каждой конфигурации.
+                path = os.path.join(directory, f'{number}.sqlite3')
+                result = self.run(path, pragmas, options)
+                self.stdout.write(
+                    '{name}: чтений {reads:.0f}/с, записей {writes:.0f}/с, '
+                    'повторов записи {retries}, '
+                    'ошибок «database is locked» {errors}, '
+                    'чтение p50 {read_p50:.2f} мс, p99 {read_p99:.2f} мс, '
+                    'запись p99 {write_p99:.2f} мс'.format(
+                        name=name, **result)
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, path, pragmas, options):
+        setup = connect(path, pragmas)
+        for statement in SCHEMA:
+            setup.execute(statement)
+        now = time.time()
+        setup.execute('BEGIN')
+        setup.executemany(
+            'INSERT INTO post (pub_date, text) VALUES (?, ?)',
+            ((now - number, 'Пост') for number in range(options['posts'])),
+        )
+        setup.execute('COMMIT')
+        setup.close()
+
+        # Процессы, а не потоки: как у веб-сервера с несколькими
+        # воркерами, и GIL не смешивается с блокировками SQLite.
+        queue = multiprocessing.Queue()
+        deadline = time.time() + options['seconds']
+        workers = (
+            [multiprocessing.Process(
+                target=read_worker, args=(path, pragmas, deadline, queue))
+             for _ in range(options['readers'])]
+            + [multiprocessing.Process(
+                target=write_worker,
+                args=(path, pragmas, deadline, queue,
+                      settings.SQLITE_BUSY_RETRIES))
+               for _ in range(options['writers'])]
+        )
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        stats = {'read': [], 'write': [], 'errors': 0, 'retries': 0}
+        for _ in workers:
+            kind, latencies, retries, errors = queue.get()
+            stats[kind] += latencies
+            stats['retries'] += retries
+            stats['errors'] += errors
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'reads': len(stats['read']) / elapsed,
+            'writes': len(stats['write']) / elapsed,
+            'errors': stats['errors'],
+            'retries': stats['retries'],
+            'read_p50': percentile(stats['read'], 0.5) * 1000,
+            'read_p99': percentile(stats['read'], 0.99) * 1000,
+            'write_p99': percentile(stats['write'], 0.99) * 1000,
+        }
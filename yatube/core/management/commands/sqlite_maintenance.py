@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.sqlite import enable_incremental_vacuum, maintain
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание SQLite: PRAGMA optimize или ANALYZE, incremental '
+        'vacuum и контрольная точка WAL. Запускайте по расписанию, '
+        'например раз в час из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Полный ANALYZE вместо PRAGMA optimize.',
+        )
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=0,
+            help='Сколько свободных страниц вернуть; 0 — все.',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Один раз перевести базу в auto_vacuum=INCREMENTAL '
+                 '(полный VACUUM, база блокируется).',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite.')
+        if options['enable_incremental_vacuum']:
+            enable_incremental_vacuum(connection)
+        result = maintain(
+            connection,
+            vacuum_pages=options['vacuum_pages'],
+            full_analyze=options['analyze'],
+        )
+        if not result['incremental']:
+            self.stdout.write(
+                'auto_vacuum выключен, свободные страницы не возвращены; '
+                'см. --enable-incremental-vacuum.')
+        self.stdout.write(self.style.SUCCESS(
+            'Страниц: {} -> {}, свободных: {} -> {}.'.format(
+                result['before']['pages'], result['after']['pages'],
+                result['before']['free_pages'],
+                result['after']['free_pages'],
+            )
+        ))
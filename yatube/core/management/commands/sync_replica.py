@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db import DEFAULT, REPLICA, replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файл реплики: локальная '
+        'замена репликации для проверки core.db.ReplicaRouter.'
+    )
+
+    def handle(self, *args, **options):
+        if replica_alias() is None:
+            raise CommandError(
+                'Реплика не настроена или указывает на основную базу.')
+        source = connections[DEFAULT]
+        if source.vendor != 'sqlite':
+            raise CommandError('Копировать можно только базу SQLite.')
+        source.ensure_connection()
+        target = sqlite3.connect(connections.databases[REPLICA]['NAME'])
+        try:
+            # Онлайн-копия: писатели основной базы не блокируются надолго.
+            source.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS('Реплика обновлена.'))
@@ -0,0 +1,104 @@
+"""Настройки SQLite для нагрузки: WAL, PRAGMA соединения и повтор
+записи, если база занята.
+
+В режиме WAL читатели не ждут писателя, а писатель — читателей, но
+писатель по-прежнему один. Транзакция Django начинается как
+deferred: если она сначала читает, а потом пишет, SQLite может сразу
+ответить «database is locked», не дожидаясь busy_timeout. Такую
+транзакцию нужно начать заново — это делает `retry_on_busy`.
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+BUSY_MESSAGES = ('database is locked', 'database table is locked')
+# Сколько значений передавать в одном IN (...): SQLite до 3.32
+# принимает не больше 999 параметров в запросе, остаётся запас на
+# остальные.
+MAX_PARAMS = 500
+# первая пауза перед повтором, дальше она удваивается
+RETRY_DELAY = 0.05
+
+
+def chunks(values, size=MAX_PARAMS):
+    """Значения списками не длиннее size, например для IN (...)."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def apply_pragmas(cursor, pragmas):
+    # Значения берутся из настроек, а не от пользователя.
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: SQLITE_PRAGMAS для нового
+    соединения."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+
+
+def is_busy(error):
+    return any(message in str(error) for message in BUSY_MESSAGES)
+
+
+def retry_delay(attempt):
+    """Пауза перед повтором: случайная, чтобы писатели разошлись."""
+    return random.uniform(0, RETRY_DELAY * 2 ** attempt)
+
+
+def retry_on_busy(view):
+    """Повторяет view, если база была занята другим писателем.
+
+    Ставится снаружи transaction.atomic, чтобы повторялась вся
+    транзакция целиком; внутри чужой транзакции повторять нельзя.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        retries = settings.SQLITE_BUSY_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return view(request, *args, **kwargs)
+            except OperationalError as error:
+                if (attempt == retries or not is_busy(error)
+                        or transaction.get_connection().in_atomic_block):
+                    raise
+            time.sleep(retry_delay(attempt))
+    return wrapper
+
+
+def maintain(connection, vacuum_pages=0, full_analyze=False):
+    """Обслуживание базы: статистика планировщика, возврат свободных
+    страниц и контрольная точка WAL. Возвращает размеры до и после."""
+    with connection.cursor() as cursor:
+        def sizes():
+            cursor.execute('PRAGMA page_count')
+            pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            return {'pages': pages, 'free_pages': cursor.fetchone()[0]}
+
+        before = sizes()
+        # optimize пересчитывает статистику только там, где она устарела.
+        cursor.execute('ANALYZE' if full_analyze else 'PRAGMA optimize')
+        cursor.execute('PRAGMA auto_vacuum')
+        incremental = cursor.fetchone()[0] == 2
+        if incremental:
+            cursor.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        after = sizes()
+    return {'before': before, 'after': after, 'incremental': incremental}
+
+
+def enable_incremental_vacuum(connection):
+    """Переводит базу в auto_vacuum=INCREMENTAL; нужен полный VACUUM,
+    который блокирует базу на время копирования."""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
@@ -0,0 +1,9 @@
+"""Перцентили задержек для замеров (`bench`, `soak`, `sqlite_bench`)."""
+
+
+def percentile(values, share):
+    """Значение, ниже которого доля `share` замеров (nearest rank)."""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
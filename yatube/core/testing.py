@@ -0,0 +1,147 @@
+"""Инструменты тестов: свой кеш для прогона и контроль числа
+SQL-запросов на страницу."""
+import os
+import re
+import shutil
+import sys
+import tempfile
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.template.base import Node
+from django.test import runner
+from django.test.utils import override_settings
+
+from .cache import isolated_caches
+
+NUMBERS = re.compile(r'\b\d+\b')
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+# Каталог кеша текущего прогона; процессы --parallel получают его при fork.
+_cache_dir = None
+
+
+def normalize(sql):
+    """SQL без конкретных значений: одинаковые запросы с разными id
+    схлопываются в одну строку."""
+    return NUMBERS.sub('?', STRINGS.sub('?', sql))
+
+
+def template_location():
+    """Шаблон и строка узла, который сейчас рендерится, если есть."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance(): ленивые объекты вроде request.user
+        # подменяют __class__ и выполнили бы запрос.
+        if issubclass(type(node), Node) and getattr(node, 'token', None):
+            origin = getattr(node, 'origin', None)
+            name = (origin.template_name or origin.name) if origin else '?'
+            return '%s:%s' % (name, node.token.lineno)
+        frame = frame.f_back
+    return None
+
+
+class QueryLog:
+    """Контекстный менеджер: записывает выполненный SQL вместе с местом
+    в шаблоне, из которого запрос был вызван."""
+
+    def __init__(self, using=connection):
+        self.connection = using
+        self.queries = []
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self._record)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def _record(self, execute, sql, params, many, context):
+        self.queries.append((sql, template_location()))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def counts(self):
+        return Counter(normalize(sql) for sql, _ in self.queries)
+
+    def locations(self):
+        found = defaultdict(set)
+        for sql, location in self.queries:
+            if location:
+                found[normalize(sql)].add(location)
+        return found
+
+
+def constant_queries_report(render, grow, sizes=(1, 5)):
+    """Рендерит страницу при разном объёме данных.
+
+    `grow(n)` доводит данные до n объектов, `render()` выполняет запрос.
+    Возвращает None, если число запросов не зависит от n, иначе текст
+    с запросами, число которых растёт, и местами в шаблонах.
+    """
+    # Прогрев: ленивое создание строк, кеши ContentType и т.п.
+    # не должны попасть в первое измерение.
+    grow(sizes[0])
+    render()
+    logs = {}
+    for size in sizes:
+        grow(size)
+        with QueryLog() as log:
+            render()
+        logs[size] = log
+
+    totals = {size: len(log) for size, log in logs.items()}
+    if len(set(totals.values())) == 1:
+        return None
+
+    first, last = logs[sizes[0]], logs[sizes[-1]]
+    before, after = first.counts(), last.counts()
+    locations = last.locations()
+    lines = ['Число запросов зависит от объёма данных: %s' % totals]
+    for sql, count in after.most_common():
+        if count <= before.get(sql, 0):
+            continue
+        where = ', '.join(sorted(locations.get(sql, ()))) or 'вне шаблона'
+        lines.append('  x%s (было %s) [%s]\n    %s' % (
+            count, before.get(sql, 0), where, sql))
+    return '\n'.join(lines)
+
+
+def assert_constant_queries(render, grow, sizes=(1, 5)):
+    report = constant_queries_report(render, grow, sizes)
+    if report:
+        raise AssertionError(report)
+
+
+def _init_worker(counter):
+    runner._init_worker(counter)
+    # Каждому процессу --parallel свой кеш: cache.clear() в тестах одного
+    # процесса не сбрасывает кеш соседей.
+    override_settings(CACHES=isolated_caches(
+        os.path.join(_cache_dir, str(runner._worker_id)))).enable()
+
+
+class IsolatedCacheParallelTestSuite(runner.ParallelTestSuite):
+    init_worker = _init_worker
+
+
+class IsolatedCacheRunner(runner.DiscoverRunner):
+    """Запускает тесты с кешем во временном каталоге, а не в CACHE_DIR
+    работающего сервера."""
+
+    parallel_test_suite = IsolatedCacheParallelTestSuite
+
+    def setup_test_environment(self, **kwargs):
+        global _cache_dir
+        super().setup_test_environment(**kwargs)
+        _cache_dir = tempfile.mkdtemp(prefix='yatube-test-cache-')
+        self._caches = override_settings(CACHES=isolated_caches(_cache_dir))
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        shutil.rmtree(_cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
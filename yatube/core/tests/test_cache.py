@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+# Второй процесс со своим L1 и тем же L2 и каналом.
+OTHER_PROCESS = '''
+import json, sys
+import django
+from django.conf import settings
+settings.configure(CACHES=json.loads(sys.argv[1]))
+django.setup()
+from django.core.cache import cache
+exec(sys.argv[2])
+'''
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.config = self.get_config()
+        settings_override = self.settings(CACHES=self.config)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cache = caches['default']
+
+    def get_config(self, **options):
+        options.setdefault(
+            'CHANNEL', os.path.join(self.cache_dir, 'invalidations.log'))
+        return {
+            'default': {
+                'BACKEND': 'core.cache.TieredCache',
+                'LOCATION': 'shared',
+                'OPTIONS': options,
+            },
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(self.cache_dir, 'shared'),
+            },
+        }
+
+    def run_other_process(self, code):
+        subprocess.run(
+            [sys.executable, '-c', OTHER_PROCESS,
+             json.dumps(self.config), code],
+            cwd=settings.BASE_DIR, check=True,
+        )
+
+    def test_reads_are_served_from_l1(self):
+        """Прочитанное значение берётся из памяти процесса."""
+        self.cache.set('key', 'value')
+        caches['shared'].set('key', 'changed behind the channel')
+
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get_many(['key']), {'key': 'value'})
+
+    def test_write_in_other_process_evicts_l1(self):
+        """Запись в другом процессе сбрасывает ключ в L1 этого."""
+        self.cache.set('key', 'old')
+        self.cache.set('other', 'kept')
+        self.assertEqual(self.cache.get('key'), 'old')
+
+        self.run_other_process("cache.set('key', 'new')")
+
+        self.assertEqual(self.cache.get('key'), 'new')
+        self.assertEqual(self.cache.get('other'), 'kept')
+
+    def test_incr_in_other_process_evicts_l1(self):
+        """Версии фрагментов (incr) видны всем процессам сразу."""
+        self.cache.set('version', 1, None)
+
+        self.run_other_process("cache.incr('version')")
+
+        self.assertEqual(self.cache.get('version'), 2)
+
+    def test_clear_in_other_process_clears_l1(self):
+        self.cache.set('key', 'value')
+
+        self.run_other_process('cache.clear()')
+
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_channel_rotation_clears_l1(self):
+        """После ротации файла канала L1 очищается целиком."""
+        self.config = self.get_config(CHANNEL_MAX_SIZE=1)
+        self.settings(CACHES=self.config).enable()
+        self.cache = caches['default']
+        self.cache.set('key', 'old')
+        self.cache.get('key')
+        caches['shared'].set('key', 'new')
+
+        self.run_other_process("cache.set('unrelated', 1)")
+
+        self.assertEqual(self.cache.get('key'), 'new')
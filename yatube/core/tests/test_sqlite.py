@@ -0,0 +1,76 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+
+from core.sqlite import retry_on_busy
+
+
+class PragmaTests(TestCase):
+    def test_connection_pragmas(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+@override_settings(SQLITE_BUSY_RETRIES=2)
+class RetryOnBusyTests(SimpleTestCase):
+    databases = {'default'}
+
+    def view(self, *errors):
+        calls = []
+
+        @retry_on_busy
+        def view(request):
+            calls.append(request)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return 'ok'
+        return view, calls
+
+    def test_retries_locked_database(self):
+        locked = OperationalError('database is locked')
+        view, calls = self.view(locked, locked)
+
+        self.assertEqual(view('request'), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up(self):
+        locked = OperationalError('database is locked')
+        view, calls = self.view(locked, locked, locked)
+
+        with self.assertRaises(OperationalError):
+            view('request')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        view, calls = self.view(OperationalError('no such table: x'))
+
+        with self.assertRaises(OperationalError):
+            view('request')
+        self.assertEqual(len(calls), 1)
+
+    def test_not_retried_inside_outer_transaction(self):
+        """Откат внутреннего блока не отменит записи внешней транзакции,
+           поэтому повторять нечего."""
+        view, calls = self.view(OperationalError('database is locked'))
+
+        with self.assertRaises(OperationalError), transaction.atomic():
+            view('request')
+        self.assertEqual(len(calls), 1)
+
+
+class MaintenanceCommandTests(TransactionTestCase):
+    def test_maintenance(self):
+        out = StringIO()
+        call_command('sqlite_maintenance', analyze=True, stdout=out)
+
+        self.assertIn('Страниц', out.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM sqlite_stat1')
+            self.assertGreater(cursor.fetchone()[0], 0)
@@ -1,24 +1,117 @@
+from datetime import datetime
+
 from django.contrib import admin
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.dates import MONTHS
+
+from .models import Comment, Follow, Group, Post, User
+from .search import match_query, matching_posts
+from .utils import EstimatedCountPaginator
+
+
+class PublishedFilter(admin.SimpleListFilter):
+    """Год и месяц публикации вместо date_hierarchy.
 
-from .models import Comment, Follow, Group, Post
+    date_hierarchy строит варианты через SELECT DISTINCT по всей
+    таблице; здесь годы берутся из MIN/MAX(pub_date) по индексу,
+    а отбор — диапазоном дат.
+    """
+    title = 'год и месяц публикации'
+    parameter_name = 'published'
+
+    def lookups(self, request, model_admin):
+        bounds = Post.objects.aggregate(
+            first=Min('pub_date'), last=Max('pub_date'))
+        if bounds['first'] is None:
+            return ()
+        choices = []
+        selected = self.value() or ''
+        for year in range(bounds['last'].year, bounds['first'].year - 1, -1):
+            choices.append((str(year), str(year)))
+            if selected[:4] == str(year):
+                choices += [
+                    ('%s-%02d' % (year, month), '%s %s' % (name, year))
+                    for month, name in MONTHS.items()
+                ]
+        return choices
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        try:
+            year, month = value.split('-') if '-' in value else (value, 0)
+            year, month = int(year), int(month)
+            start = datetime(year, month or 1, 1)
+            if month:
+                end = datetime(year + month // 12, month % 12 + 1, 1)
+            else:
+                end = datetime(year + 1, 1, 1)
+        except ValueError:
+            return queryset.none()
+        tz = timezone.get_current_timezone()
+        return queryset.filter(
+            pub_date__gte=timezone.make_aware(start, tz),
+            pub_date__lt=timezone.make_aware(end, tz),
+        )
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', PublishedFilter)
     list_editable = ('group',)
+    # Вместо <select> со всеми группами и пользователями в каждой строке.
+    autocomplete_fields = ('author', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице — полнотекстовый индекс.
+        if not match_query(search_term):
+            return queryset, False
+        return queryset.filter(pk__in=matching_posts(search_term)), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    empty_value_display = '-пусто-'
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    raw_id_fields = ('post', 'author')
+    list_select_related = ('post', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'author')
-    list_editable = ('user', 'author',)
-    list_filter = ('user', 'author',)
+    # Виджеты внешних ключей в списке делают запрос на каждую строку,
+    # поэтому подписка правится только на своей странице.
+    raw_id_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Фильтр по пользователю: точное имя ищется по уникальному
+        # индексу, а не LIKE по объединению с таблицей пользователей.
+        username = search_term.strip()
+        if not username:
+            return queryset, False
+        users = User.objects.filter(username=username).values('pk')
+        return queryset.filter(Q(user__in=users) | Q(author__in=users)), False
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
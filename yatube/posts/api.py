@@ -0,0 +1,201 @@
+"""JSON API только для чтения: ленты, пост, комментарии и пачка постов.
+
+Строки читаются через values() только с запрошенными полями
+(`?fields=id,text,author`), без создания моделей и рендера шаблонов.
+Ленты листаются курсором (`?cursor=`), как HTML-страницы с курсорами:
+без COUNT и OFFSET.
+"""
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from .models import Comment, Group, Post, User
+from .utils import NEXT, decode_cursor, encode_cursor, keyset_slice
+
+MAX_LIMIT = 100
+MAX_BATCH = 100
+
+# Поле ответа -> столбец для values().
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class ApiError(Exception):
+    pass
+
+
+def api_view(view):
+    """GET-запрос и ошибки в виде JSON, а не HTML-страниц."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except ApiError as error:
+            return _json({'error': str(error)}, status=400)
+        except Http404:
+            return _json({'error': 'Не найдено.'}, status=404)
+        return _json(data)
+    return wrapper
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _fields(request, available):
+    """Запрошенные поля ответа; по умолчанию все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError('Неизвестные поля: ' + ', '.join(unknown))
+    return fields
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_COUNT))
+    except ValueError:
+        raise ApiError('limit должен быть числом.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _cursor(request):
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return None
+    decoded = decode_cursor(cursor)
+    if (decoded is None or decoded[1] is None
+            or not isinstance(decoded[1][0], datetime)):
+        raise ApiError('Неверный курсор.')
+    return decoded[1]
+
+
+def _rows(queryset, request, available, extra=()):
+    """Строки values() с запрошенными полями и ключами курсора."""
+    fields = _fields(request, available)
+    columns = {available[name] for name in fields} | set(extra)
+    return fields, queryset.values(*columns)
+
+
+def _post(row, fields, request):
+    data = {name: row[POST_FIELDS[name]] for name in fields}
+    if data.get('image') is not None:
+        data['image'] = (
+            request.build_absolute_uri(default_storage.url(data['image']))
+            if data['image'] else None
+        )
+    return data
+
+
+def _comment(row, fields):
+    return {name: row[COMMENT_FIELDS[name]] for name in fields}
+
+
+def _feed(request, posts):
+    fields, rows = _rows(posts, request, POST_FIELDS, ('pub_date', 'id'))
+    limit = _limit(request)
+    rows = keyset_slice(rows, _cursor(request), False, limit + 1)
+    return {
+        'results': [_post(row, fields, request) for row in rows[:limit]],
+        'next': (
+            encode_cursor(NEXT, (rows[limit - 1]['pub_date'],
+                                 rows[limit - 1]['id']))
+            if len(rows) > limit else None
+        ),
+    }
+
+
+@api_view
+def index(request):
+    return _feed(request, Post.objects.all())
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return _feed(request, Post.objects.filter(group=group))
+
+
+@api_view
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return _feed(request, Post.objects.filter(author=author))
+
+
+@api_view
+def post_detail(request, post_id):
+    fields, rows = _rows(Post.objects.filter(pk=post_id), request, POST_FIELDS)
+    row = rows.first()
+    if row is None:
+        raise Http404
+    return _post(row, fields, request)
+
+
+@api_view
+def post_comments(request, post_id):
+    """Комментарии от старых к новым, как на странице поста."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    fields, rows = _rows(
+        Comment.objects.filter(post_id=post_id), request, COMMENT_FIELDS,
+        ('created', 'id'),
+    )
+    limit = _limit(request)
+    key = _cursor(request)
+    if key is not None:
+        rows = rows.filter(
+            Q(created__gt=key[0]) | Q(created=key[0], id__gt=key[1]))
+    rows = list(rows.order_by('created', 'id')[:limit + 1])
+    return {
+        'results': [_comment(row, fields) for row in rows[:limit]],
+        'next': (
+            encode_cursor(NEXT, (rows[limit - 1]['created'],
+                                 rows[limit - 1]['id']))
+            if len(rows) > limit else None
+        ),
+    }
+
+
+@api_view
+def posts_batch(request):
+    """Посты по списку id (`?ids=3,1,2`) одним запросом, в том же
+    порядке; ненайденные перечислены в missing."""
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        raise ApiError('ids должны быть числами через запятую.')
+    if len(ids) > MAX_BATCH:
+        raise ApiError(f'Не больше {MAX_BATCH} id за запрос.')
+    fields, rows = _rows(
+        Post.objects.filter(pk__in=ids), request, POST_FIELDS, ('id',))
+    found = {row['id']: row for row in rows.order_by()}
+    return {
+        'results': [
+            _post(found[pk], fields, request) for pk in ids if pk in found
+        ],
+        'missing': [pk for pk in ids if pk not in found],
+    }
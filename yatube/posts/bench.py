@@ -0,0 +1,229 @@
+"""Замер страниц под нагрузкой: `manage.py bench`.
+
+Набор данных создаётся заново во временной базе генератором
+synthetic из зерна (seed), поэтому замеры разных коммитов сравнимы.
+Каждый именованный URL из posts.urls, users.urls и about.urls
+запрашивается через WSGIHandler — со всеми middleware, как у
+настоящего сервера — от гостя и от вошедшего пользователя. Для каждого URL
+считаются задержки p50/p95/p99, число SQL-запросов и размер ответа.
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, RequestFactory
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from core.cache import isolated_caches
+from core.stats import percentile
+from users import urls as users_urls
+
+from . import urls as posts_urls
+from .importer import rebuild_derived
+from .models import Group, Post, User
+from .synthetic import WORDS, Generator
+
+URLCONFS = (posts_urls, users_urls, about_urls)
+# GET этих URL меняет данные или сессию, их не замеряем.
+SKIP = {'posts:profile_follow', 'posts:profile_unfollow', 'users:logout'}
+# Не 127.0.0.1 из INTERNAL_IPS, чтобы не включалась панель отладки.
+REMOTE_ADDR = '10.0.0.1'
+
+
+class Dataset:
+    """Объекты набора, на которые ссылаются URL замера."""
+
+    def __init__(self, user, author, group, post, word):
+        self.user = user
+        self.author = author
+        self.group = group
+        self.post = post
+        self.word = word
+
+
+@contextmanager
+def temporary_database():
+    """Пустая база, кеш и медиа на время замера вместо рабочих.
+
+    Кеш сервера, запущенного рядом, замер не читает и не сбрасывает.
+    """
+    directory = tempfile.mkdtemp()
+    # В файле, а не в памяти: как у рабочей базы.
+    test_settings = connections[DEFAULT_DB_ALIAS].settings_dict['TEST']
+    old_name = test_settings['NAME']
+    test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    isolated = override_settings(
+        CACHES=isolated_caches(os.path.join(directory, 'cache')),
+        MEDIA_ROOT=os.path.join(directory, 'media'),
+    )
+    isolated.enable()
+    try:
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            yield
+        finally:
+            teardown_databases(old_config, verbosity=0)
+    finally:
+        isolated.disable()
+        test_settings['NAME'] = old_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def session_cookie(user):
+    """Заголовок Cookie с сессией вошедшего `user`."""
+    client = Client()
+    client.force_login(user)
+    name = settings.SESSION_COOKIE_NAME
+    return f'{name}={client.cookies[name].value}'
+
+
+def seed(users=100, groups=10, posts=2000, comments=5000, follows=20,
+         seed=1):
+    """Создаёт набор данных; одинаковое зерно даёт одинаковый набор."""
+    generator = Generator(seed=seed, prefix='bench', image_share=0)
+    generator.generate(users=users, groups=groups, posts=posts,
+                       comments=comments, follows=follows)
+    rebuild_derived()
+
+    user = User.objects.get(username='bench0')
+    return Dataset(
+        user=user,
+        # самый популярный автор, кроме самого пользователя
+        author=User.objects.get(pk=next(
+            pk for pk in generator.popular_ids if pk != user.pk)),
+        group=Group.objects.get(slug='bench-0'),
+        # пост пользователя, чтобы post_edit открывал форму
+        post=user.posts.order_by('-pub_date').first()
+        or Post.objects.order_by('-pub_date').first(),
+        word=WORDS[0],
+    )
+
+
+def url_cases(data):
+    """Пары (имя URL, путь, GET-параметры) для замера."""
+    values = {
+        'slug': data.group.slug,
+        'username': data.author.username,
+        'post_id': data.post.pk,
+        'uidb64': urlsafe_base64_encode(force_bytes(data.user.pk)),
+        'token': default_token_generator.make_token(data.user),
+    }
+    params = {'posts:search': {'q': data.word}}
+    cases = []
+    for urlconf in URLCONFS:
+        for pattern in urlconf.urlpatterns:
+            name = f'{urlconf.app_name}:{pattern.name}'
+            if name in SKIP:
+                continue
+            kwargs = {
+                key: values[key]
+                for key in pattern.pattern.regex.groupindex
+            }
+            cases.append(
+                (name, reverse(name, kwargs=kwargs), params.get(name, {})))
+    return cases
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentiles(values):
+    """p50, p95, p99 в миллисекундах."""
+    return {
+        f'p{share}_ms': round(percentile(values, share / 100) * 1000, 3)
+        for share in (50, 95, 99)
+    }
+
+
+class Runner:
+    def __init__(self, requests=20, warmup=2):
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory(
+            HTTP_HOST='localhost', REMOTE_ADDR=REMOTE_ADDR)
+        self.requests = requests
+        self.warmup = warmup
+
+    def call(self, path, params, cookie):
+        """Один запрос: (статус, байты, запросы к БД, секунды)."""
+        environ = self.factory.get(path, params).environ
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        status = []
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(counter))
+            started = time.perf_counter()
+            body = self.handler(
+                environ, lambda line, headers, *args: status.append(line))
+            try:
+                size = sum(len(chunk) for chunk in body)
+            finally:
+                body.close()
+            elapsed = time.perf_counter() - started
+        return int(status[0].split()[0]), size, counter.count, elapsed
+
+    def measure(self, path, params, cookie):
+        for _ in range(self.warmup):
+            self.call(path, params, cookie)
+        timings, queries = [], []
+        for _ in range(self.requests):
+            status, size, count, elapsed = self.call(path, params, cookie)
+            timings.append(elapsed)
+            queries.append(count)
+        return {
+            'status': status,
+            'bytes': size,
+            'queries': statistics.median_low(queries),
+            **percentiles(timings),
+        }
+
+    def run(self, data, progress=None):
+        """{имя URL: {'anonymous': замер, 'user': замер}}."""
+        modes = {
+            'anonymous': None,
+            'user': session_cookie(data.user),
+        }
+        results = {}
+        for name, path, params in url_cases(data):
+            results[name] = {}
+            for mode, cookie in modes.items():
+                results[name][mode] = self.measure(path, params, cookie)
+                if progress:
+                    progress(name, mode, results[name][mode])
+        return results
+
+
+def compare(old, new):
+    """Строки (url, режим, p50 было/стало, запросы было/стало)."""
+    rows = []
+    for name, modes in sorted(new.items()):
+        for mode, result in sorted(modes.items()):
+            before = old.get(name, {}).get(mode)
+            if before is None:
+                continue
+            rows.append((
+                name, mode,
+                before['p50_ms'], result['p50_ms'],
+                before['queries'], result['queries'],
+            ))
+    return rows
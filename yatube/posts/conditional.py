@@ -0,0 +1,75 @@
+"""Условные GET-запросы (ETag / Last-Modified) для страниц лент и поста.
+
+Валидатор страницы собирается из версий областей кеша (`versions`):
+их увеличивает каждое изменение, которое видно на странице. Это одно
+чтение кеша без запроса страницы, поэтому неизменившаяся страница
+отдаётся как 304 Not Modified ещё до рендера.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from . import versions
+
+
+def _etag(request, version):
+    user = request.user
+    parts = [
+        version,
+        str(user.pk) if user.is_authenticated else '',
+        # В форме комментария страница содержит CSRF-токен; новый токен
+        # появляется в META при рендере первой страницы.
+        request.META.get('CSRF_COOKIE', ''),
+    ]
+    return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def conditional_page(get_scopes):
+    """Декоратор view: `get_scopes(request, *args, **kwargs)` возвращает
+    области, от которых зависит страница, или None, если страницу
+    нужно просто отрендерить (например, объекта нет и будет 404)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            version = versions.current(*scopes)
+            # view может использовать версию как ключ своего кеша
+            request.page_version = version
+            etag = _etag(request, version)
+            changed = versions.last_changed(*scopes).timestamp()
+            # Пока реплика может отставать от недавнего изменения, страница
+            # читается из основной базы (`core.db.use_replica`): иначе
+            # старые данные попали бы в кеш под новой версией.
+            request.replica_allowed = (
+                time.time() - changed > settings.REPLICA_LAG)
+            # Для вошедшего пользователя страница зависит ещё и от сессии,
+            # поэтому проверяем только ETag.
+            last_modified = None
+            if not request.user.is_authenticated:
+                last_modified = changed
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                etag = _etag(request, version)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(
+                    response, max_age=0,
+                    private=request.user.is_authenticated,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
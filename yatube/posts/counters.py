@@ -0,0 +1,117 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.sqlite import MAX_PARAMS, chunks
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .utils import pk_batches
+
+
+def _change(queryset, field, delta):
+    """Сдвигает счётчик одним UPDATE, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_group(group_id, field, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(pk=group_id), field, delta)
+
+
+def change_post_group(post_id, field, delta):
+    _change(Group.objects.filter(posts=post_id), field, delta)
+
+
+def change_post(post_id, field, delta):
+    _change(Post.objects.filter(pk=post_id), field, delta)
+
+
+def change_user(user_id, field, delta):
+    updated = _change(UserStats.objects.filter(user_id=user_id), field, delta)
+    if updated or delta < 0:
+        # При удалении недостающую строку не создаём: пользователь
+        # может удаляться каскадом, расхождение исправит recount.
+        return
+    # Строки ещё нет: один раз считаем по факту.
+    try:
+        with transaction.atomic():
+            UserStats.objects.create(user_id=user_id, **count_user(user_id))
+    except IntegrityError:
+        # Строку успел создать параллельный запрос.
+        _change(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def count_user(user_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'comments_count': Comment.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+    }
+
+
+def user_posts_count(user):
+    stats = getattr(user, 'stats', None)
+    if stats is not None:
+        return stats.posts_count
+    return user.posts.count()
+
+
+def _count(queryset, field):
+    """Подзапрос COUNT(*) по `field` для UPDATE ... SET x = (SELECT ...)."""
+    subquery = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def _batches(queryset, batch_size, pks=None):
+    """Первичные ключи queryset пачками; с `pks` — только эти ключи."""
+    if pks is None:
+        return pk_batches(queryset, batch_size)
+    return chunks(sorted(pks), min(batch_size, MAX_PARAMS))
+
+
+def recount(batch_size=1000, post_ids=None, group_ids=None, user_ids=None):
+    """Пересчитывает счётчики пачками по первичному ключу: все или,
+    если переданы id, только счётчики этих постов, групп и
+    пользователей (тогда непереданные не пересчитываются).
+
+    Возвращает количество обработанных постов, групп и пользователей.
+    """
+    totals = {'posts': 0, 'groups': 0, 'users': 0}
+    if any(ids is not None for ids in (post_ids, group_ids, user_ids)):
+        post_ids = post_ids or ()
+        group_ids = group_ids or ()
+        user_ids = user_ids or ()
+
+    for pks in _batches(Post.objects.all(), batch_size, post_ids):
+        with transaction.atomic():
+            Post.objects.filter(pk__in=pks).update(
+                comments_count=_count(Comment.objects.all(), 'post'),
+            )
+        totals['posts'] += len(pks)
+
+    for pks in _batches(Group.objects.all(), batch_size, group_ids):
+        with transaction.atomic():
+            Group.objects.filter(pk__in=pks).update(
+                posts_count=_count(Post.objects.all(), 'group'),
+                comments_count=_count(Comment.objects.all(), 'post__group'),
+            )
+        totals['groups'] += len(pks)
+
+    for pks in _batches(User.objects.all(), batch_size, user_ids):
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                [UserStats(user_id=pk) for pk in pks],
+                ignore_conflicts=True,
+            )
+            UserStats.objects.filter(user_id__in=pks).update(
+                posts_count=_count(Post.objects.all(), 'author'),
+                comments_count=_count(Comment.objects.all(), 'author'),
+                followers_count=_count(Follow.objects.all(), 'author'),
+            )
+        totals['users'] += len(pks)
+
+    return totals
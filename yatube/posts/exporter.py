@@ -0,0 +1,115 @@
+"""Потоковая выгрузка постов автора или группы в NDJSON или CSV.
+
+Посты читаются через `.iterator(chunk_size)`, без кеша результатов
+QuerySet, и сразу превращаются в строки, поэтому память не зависит
+от числа постов. Комментарии загружаются отдельным запросом на каждую
+пачку постов и выводятся следом за своим постом.
+
+Записи в том же формате, что читает `import_data`:
+
+    {"type": "post", "id": 10, "author": "leo", "group": "cats",
+     "text": "...", "pub_date": "2019-05-01T10:00:00+00:00"}
+    {"type": "comment", "id": 3, "post": 10, "author": "tolstoy",
+     "text": "...", "created": "2019-05-02T10:00:00+00:00"}
+"""
+import csv
+import json
+from itertools import groupby, islice
+
+from django.core.files.storage import default_storage
+
+from core.sqlite import MAX_PARAMS
+
+from .models import Comment
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+CSV_FIELDS = (
+    'type', 'id', 'post', 'author', 'group', 'text', 'pub_date', 'created',
+    'image', 'image_url',
+)
+
+
+def _post_record(row, image_url):
+    record = {
+        'type': 'post',
+        'id': row['id'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+    }
+    if image_url:
+        record['image'] = row['image'] or None
+        record['image_url'] = (
+            image_url(default_storage.url(row['image']))
+            if row['image'] else None
+        )
+    return record
+
+
+def _comment_record(row):
+    return {
+        'type': 'comment',
+        'id': row['id'],
+        'post': row['post_id'],
+        'author': row['author__username'],
+        'text': row['text'],
+        'created': row['created'].isoformat(),
+    }
+
+
+def export_records(posts, comments=False, image_url=None, chunk_size=500):
+    """Записи постов из QuerySet posts, по одной.
+
+    `image_url(url)` превращает относительный адрес картинки в полный;
+    если он не передан, картинки не выгружаются.
+    """
+    rows = posts.values(
+        'id', 'text', 'pub_date', 'image', 'author__username', 'group__slug',
+    ).iterator(chunk_size=chunk_size)
+    if not comments:
+        for row in rows:
+            yield _post_record(row, image_url)
+        return
+    while True:
+        chunk = list(islice(rows, min(chunk_size, MAX_PARAMS)))
+        if not chunk:
+            return
+        post_comments = Comment.objects.filter(
+            post_id__in=[row['id'] for row in chunk]
+        ).order_by('post_id', 'created', 'id').values(
+            'id', 'post_id', 'text', 'created', 'author__username',
+        ).iterator(chunk_size=chunk_size)
+        by_post = {
+            post_id: [_comment_record(row) for row in group]
+            for post_id, group in groupby(
+                post_comments, key=lambda row: row['post_id'])
+        }
+        for row in chunk:
+            yield _post_record(row, image_url)
+            yield from by_post.get(row['id'], ())
+
+
+class _Echo:
+    """Буфер для csv.writer, который просто возвращает строку."""
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(_Echo(), fieldnames=CSV_FIELDS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+def export_lines(records, fmt='ndjson'):
+    return csv_lines(records) if fmt == 'csv' else ndjson_lines(records)
@@ -0,0 +1,148 @@
+"""RSS и Atom: все посты, посты группы и посты автора.
+
+Готовый XML лежит в кеше под версией области (`versions`), поэтому
+новый пост сразу даёт новый ключ, а читалки, опрашивающие ленту,
+получают 304 Not Modified по ETag или Last-Modified.
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from .conditional import conditional_page
+from .models import Group, Post, User
+
+KEY = 'syndication:{}:{}'
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние записи'
+    description = 'Новые записи всех авторов.'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return self.posts(obj).select_related('author').order_by(
+            '-pub_date', '-id')[:settings.SYNDICATION_ITEMS]
+
+    def item_title(self, item):
+        return Truncator(item.text).words(10)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_list', args=[obj.slug])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: {obj.get_full_name() or obj.username}'
+
+    def description(self, obj):
+        return f'Записи пользователя {obj.username}.'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=[obj.username])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+def _index_scopes(request):
+    return ['posts']
+
+
+def _group_scopes(request, slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    return None if pk is None else [f'group:{pk}']
+
+
+def _author_scopes(request, username):
+    pk = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    return None if pk is None else [f'author:{pk}']
+
+
+def cached_feed(feed, get_scopes):
+    """View ленты: XML из кеша по версии областей и условный GET."""
+    @conditional_page(get_scopes)
+    def view(request, *args, **kwargs):
+        version = getattr(request, 'page_version', None)
+        if version is None:
+            return feed(request, *args, **kwargs)
+        # В XML абсолютные ссылки, поэтому хост тоже входит в ключ.
+        key = KEY.format(request.get_host() + request.path, version)
+        cached = cache.get(key)
+        if cached is not None:
+            content_type, content = cached
+            return HttpResponse(content, content_type=content_type)
+        response = feed(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(
+                key, (response['Content-Type'], response.content),
+                settings.SYNDICATION_CACHE_TIMEOUT,
+            )
+        return response
+    return view
+
+
+index_rss = cached_feed(LatestPostsFeed(), _index_scopes)
+index_atom = cached_feed(LatestPostsAtomFeed(), _index_scopes)
+group_rss = cached_feed(GroupPostsFeed(), _group_scopes)
+group_atom = cached_feed(GroupPostsAtomFeed(), _group_scopes)
+profile_rss = cached_feed(AuthorPostsFeed(), _author_scopes)
+profile_atom = cached_feed(AuthorPostsAtomFeed(), _author_scopes)
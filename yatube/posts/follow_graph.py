@@ -0,0 +1,282 @@
+"""Граф подписок в памяти процесса: подписан ли A на B, сколько у
+автора подписчиков и на кого подписан пользователь — без запросов к БД.
+
+Основа графа — сжатые списки смежности в array (около 4 байт на
+подписку): авторы пользователя u лежат по возрастанию в
+targets[offsets[u]:offsets[u + 1]], число подписчиков автора — в
+followers[author]. Основа строится одним проходом по Follow в фоновом
+потоке (секунды на миллионы подписок): до первой загрузки ответы
+берутся из БД, а при перезагрузке отвечает прежний граф.
+
+Каждая подписка и отписка пишется в журнал FollowChange в той же
+транзакции. Изменения копятся в небольших множествах поверх основы;
+когда их набирается MAX_CHANGES, основа строится заново. О новых
+записях журнала процессы узнают по версии в общем кеше: после коммита
+записавший процесс кладёт туда новое уникальное значение, а остальные,
+увидев незнакомую версию, дочитывают журнал с последнего известного id.
+Версия — не счётчик: incr файлового кеша не атомарен, и два процесса,
+одновременно увеличившие N, оба записали бы N + 1. Потерянная запись
+версии ничего не теряет: журнал читается после чтения версии, поэтому
+видны все изменения, закоммиченные до неё.
+
+Граф знает только закоммиченные данные, поэтому внутри транзакции,
+которая должна видеть свои записи, ответы берутся из БД.
+"""
+import secrets
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Max
+
+from .models import Follow, FollowChange, UserStats
+
+VERSION_KEY = 'follow_graph:version'
+# Сколько изменений копится поверх основы до перезагрузки графа;
+# столько же последних записей журнала хранится.
+MAX_CHANGES = 10000
+
+
+def _new_version():
+    # Как в versions: уникальна без атомарных операций кеша.
+    return f'{int(time.time() * 1000):x}-{secrets.token_hex(4)}'
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def record(user_id, author_id, followed):
+    """Пишет подписку (followed) или отписку в журнал; вызывается в
+    транзакции изменения."""
+    change = FollowChange.objects.create(
+        user_id=user_id, author_id=author_id, followed=followed)
+    if change.pk % MAX_CHANGES == 0:
+        # Отставшие больше чем на MAX_CHANGES процессы всё равно
+        # загружают граф заново.
+        FollowChange.objects.filter(pk__lte=change.pk - MAX_CHANGES).delete()
+
+
+def record_many(pairs):
+    """Пишет в журнал подписки (user_id, author_id), созданные в обход
+    сигналов, например загрузкой архива. Уже существовавшие подписки
+    записывать можно: повторная подписка графа не меняет."""
+    FollowChange.objects.bulk_create([
+        FollowChange(user_id=user_id, author_id=author_id, followed=True)
+        for user_id, author_id in pairs
+    ])
+    last = FollowChange.objects.aggregate(last=Max('pk'))['last'] or 0
+    FollowChange.objects.filter(pk__lte=last - MAX_CHANGES).delete()
+
+
+def _discard(sets, key, value):
+    values = sets.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del sets[key]
+
+
+class FollowGraph:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Версия из кеша, после которой граф дочитал журнал.
+        self._version = None
+        # id последней применённой записи журнала; None — не загружен.
+        self._last = None
+        self._offsets = array('I', [0])
+        self._targets = array('I')
+        self._followers = array('I')
+        self._added = {}
+        self._removed = {}
+        self._changes = 0
+        # Поток, загружающий граф; запросы тем временем не ждут.
+        self._loader = None
+
+    def _ready(self):
+        """Дочитывает журнал и при необходимости запускает загрузку
+        графа в фоне; False — отвечать из БД."""
+        using = router.db_for_write(Follow)
+        if connections[using].in_atomic_block:
+            return False
+        # Версия читается до журнала: изменение, закоммиченное позже,
+        # сменит версию ещё раз.
+        version = _current_version()
+        with self._lock:
+            if self._last is None:
+                self._start_loading(using)
+                return False
+            if version != self._version:
+                if self._sync(using):
+                    self._version = version
+                else:
+                    # До конца загрузки отвечает прежний граф.
+                    self._start_loading(using)
+            if self._changes >= MAX_CHANGES:
+                self._start_loading(using)
+        return True
+
+    def load(self):
+        """Загружает граф заново из базы в текущем потоке."""
+        using = router.db_for_write(Follow)
+        self._install(_current_version(), self._build(using), using)
+
+    def _start_loading(self, using):
+        if self._loader is None or not self._loader.is_alive():
+            self._loader = threading.Thread(
+                target=self._load_in_background, args=(using,), daemon=True)
+            self._loader.start()
+
+    def _load_in_background(self, using):
+        try:
+            self.load()
+        finally:
+            # Соединение потока с базой.
+            connections.close_all()
+
+    def _build(self, using):
+        """Основа графа из Follow; долго, поэтому без блокировки."""
+        # Записи журнала до last уже отражены в Follow.
+        last = FollowChange.objects.using(using).aggregate(
+            last=Max('pk'))['last'] or 0
+        offsets = array('I', [0])
+        targets = array('I')
+        followers = array('I')
+        last_user = 0
+        rows = Follow.objects.using(using).filter(
+            user__isnull=False, author__isnull=False,
+        ).order_by('user_id', 'author_id').values_list('user_id', 'author_id')
+        for user_id, author_id in rows.iterator(chunk_size=10000):
+            if user_id != last_user:
+                # offsets[u] — начало авторов u, в том числе для id без
+                # подписок между предыдущим пользователем и этим.
+                offsets.extend(array('I', [len(targets)]) * (
+                    user_id - last_user))
+                last_user = user_id
+            targets.append(author_id)
+            if author_id >= len(followers):
+                followers.extend(array('I', [0]) * max(
+                    author_id + 1 - len(followers), len(followers)))
+            followers[author_id] += 1
+        offsets.append(len(targets))
+        return last, offsets, targets, followers
+
+    def _install(self, version, built, using):
+        with self._lock:
+            (self._last, self._offsets, self._targets,
+             self._followers) = built
+            self._added = {}
+            self._removed = {}
+            self._changes = 0
+            # Изменения во время загрузки могли попасть или не попасть
+            # в основу; повторное применение ничего не меняет.
+            self._version = version if self._sync(using) else None
+
+    def _sync(self, using):
+        """Применяет записи журнала после последней известной; False —
+        нужные записи уже удалены или их слишком много, нужна загрузка."""
+        changes = list(FollowChange.objects.using(using).filter(
+            pk__gt=self._last,
+        ).order_by('pk').values_list(
+            'pk', 'user_id', 'author_id', 'followed')[:MAX_CHANGES + 1])
+        if not changes:
+            return True
+        if changes[0][0] != self._last + 1 or len(changes) > MAX_CHANGES:
+            return False
+        for pk, user_id, author_id, followed in changes:
+            self._apply(user_id, author_id, followed)
+            self._last = pk
+        return True
+
+    def _base_range(self, user_id):
+        if user_id + 1 >= len(self._offsets):
+            return 0, 0
+        return self._offsets[user_id], self._offsets[user_id + 1]
+
+    def _in_base(self, user_id, author_id):
+        low, high = self._base_range(user_id)
+        index = bisect_left(self._targets, author_id, low, high)
+        return index < high and self._targets[index] == author_id
+
+    def _follows(self, user_id, author_id):
+        if author_id in self._added.get(user_id, ()):
+            return True
+        if author_id in self._removed.get(user_id, ()):
+            return False
+        return self._in_base(user_id, author_id)
+
+    def follows(self, user_id, author_id):
+        """Подписан ли user_id на author_id."""
+        if not self._ready():
+            return Follow.objects.filter(
+                user_id=user_id, author_id=author_id).exists()
+        with self._lock:
+            return self._follows(user_id, author_id)
+
+    def followers_count(self, author_id):
+        if not self._ready():
+            # Счётчик в UserStats меняется в той же транзакции.
+            count = UserStats.objects.filter(user_id=author_id).values_list(
+                'followers_count', flat=True).first()
+            if count is None:
+                count = Follow.objects.filter(author_id=author_id).count()
+            return count
+        with self._lock:
+            if author_id >= len(self._followers):
+                return 0
+            return self._followers[author_id]
+
+    def following_count(self, user_id):
+        if not self._ready():
+            return len(self.following(user_id))
+        with self._lock:
+            low, high = self._base_range(user_id)
+            return (high - low + len(self._added.get(user_id, ()))
+                    - len(self._removed.get(user_id, ())))
+
+    def following(self, user_id):
+        """Id авторов, на которых подписан user_id, по возрастанию."""
+        if not self._ready():
+            return list(Follow.objects.filter(
+                user_id=user_id, author__isnull=False,
+            ).order_by('author_id').values_list('author_id', flat=True))
+        with self._lock:
+            low, high = self._base_range(user_id)
+            removed = self._removed.get(user_id, ())
+            return sorted([
+                author_id for author_id in self._targets[low:high]
+                if author_id not in removed
+            ] + list(self._added.get(user_id, ())))
+
+    def changed(self):
+        """Сообщает другим процессам о закоммиченных записях журнала
+        и сразу применяет их к своему графу."""
+        cache.set(VERSION_KEY, _new_version(), None)
+        if self._last is not None:
+            self._ready()
+
+    def _apply(self, user_id, author_id, created):
+        if self._follows(user_id, author_id) == created:
+            return
+        if created == self._in_base(user_id, author_id):
+            # Возврат к основе: отменяем прежнее изменение.
+            _discard(self._removed if created else self._added,
+                     user_id, author_id)
+        else:
+            changes = self._added if created else self._removed
+            changes.setdefault(user_id, set()).add(author_id)
+        if author_id >= len(self._followers):
+            self._followers.extend(
+                array('I', [0]) * (author_id + 1 - len(self._followers)))
+        self._followers[author_id] += 1 if created else -1
+        self._changes += 1
+
+
+graph = FollowGraph()
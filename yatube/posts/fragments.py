@@ -0,0 +1,51 @@
+"""Кеш отрендеренных карточек постов (posts/includes/article.html).
+
+Карточка одинакова во всех лентах, поэтому кешируется по id поста и
+версии содержимого. Версия — хеш полей, которые выводит шаблон, так
+что правка поста или имени автора даёт новый ключ без инвалидации.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+
+TEMPLATE = 'posts/includes/article.html'
+KEY = 'article:{}:{}'
+
+
+def content_version(post):
+    author = post.author
+    parts = (
+        post.text, post.image.name, post.pub_date.isoformat(),
+        author.username, author.get_full_name(),
+    )
+    raw = '\x00'.join(str(part) for part in parts).encode()
+    return hashlib.md5(raw).hexdigest()[:16]
+
+
+def render_articles(posts):
+    """Пары (пост, html карточки) для страницы за один get_many."""
+    posts = list(posts)
+    keys = [KEY.format(post.pk, content_version(post)) for post in posts]
+    fragments = cache.get_many(keys)
+    thumbnails.prefetch([
+        post for key, post in zip(keys, posts) if key not in fragments
+    ])
+    missing, ready = {}, {}
+    for key, post in zip(keys, posts):
+        if key in fragments:
+            continue
+        missing[key] = render_to_string(TEMPLATE, {'post': post})
+        # Карточку с исходной картинкой вместо миниатюры не кешируем.
+        if not post.image or thumbnails.is_ready(post.image):
+            ready[key] = missing[key]
+    if ready:
+        cache.set_many(ready, settings.FRAGMENT_CACHE_TIMEOUT)
+    fragments.update(missing)
+    return [
+        (post, mark_safe(fragments[key])) for key, post in zip(keys, posts)
+    ]
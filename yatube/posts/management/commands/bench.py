@@ -0,0 +1,88 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from posts import bench
+
+SIZES = ('users', 'groups', 'posts', 'comments', 'follows')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет каждый URL posts, users и about на воспроизводимом наборе '
+        'данных во временной базе: задержки p50/p95/p99, число запросов '
+        'и размер ответа. Результат в JSON можно сравнить с другим '
+        'коммитом через --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Замеряемых запросов на каждый URL и режим.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Запросов до замера, например чтобы прогреть кеш.',
+        )
+        parser.add_argument('--json', help='Файл для результата в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого замера для сравнения.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть не меньше 1.')
+        old = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                old = json.load(source)['results']
+
+        with bench.temporary_database():
+            data = bench.seed(
+                seed=options['seed'],
+                **{size: options[size] for size in SIZES},
+            )
+            runner = bench.Runner(options['requests'], options['warmup'])
+            with override_settings(DEBUG=False):
+                results = runner.run(data, progress=self.progress)
+
+        if options['json']:
+            report = {
+                'meta': {
+                    'seed': options['seed'],
+                    'requests': options['requests'],
+                    'warmup': options['warmup'],
+                    'sizes': {size: options[size] for size in SIZES},
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'results': results,
+            }
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True,
+                          ensure_ascii=False)
+                output.write('\n')
+        if old is not None:
+            self.stdout.write('\nСравнение p50 и числа запросов:')
+            for row in bench.compare(old, results):
+                self.stdout.write(
+                    '{:<32} {:<9} {:>8.2f} -> {:>8.2f} мс '
+                    '{:>4} -> {:>4} запросов'.format(*row))
+
+    def progress(self, name, mode, result):
+        self.stdout.write(
+            '{:<32} {:<9} {status} p50 {p50_ms:>8.2f} p95 {p95_ms:>8.2f} '
+            'p99 {p99_ms:>8.2f} мс, запросов {queries:>3}, '
+            'байт {bytes}'.format(name, mode, **result)
+        )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporter import export_lines, export_records
+from posts.models import Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты автора или группы в NDJSON или CSV, '
+        'не загружая их все в память.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--author', help='Имя пользователя.')
+        source.add_argument('--group', help='Slug группы.')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'), default='ndjson')
+        parser.add_argument(
+            '--comments', action='store_true',
+            help='Выгрузить комментарии следом за каждым постом.',
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Адрес сайта для ссылок на картинки, например '
+                 'https://yatube.ru; без него картинки не выгружаются.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько строк читать из базы за раз.',
+        )
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл для выгрузки; по умолчанию stdout.',
+        )
+
+    def handle(self, *args, **options):
+        if options['author']:
+            try:
+                author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError(f'Нет автора {options["author"]!r}.')
+            posts = Post.objects.filter(author=author)
+        else:
+            try:
+                group = Group.objects.get(slug=options['group'])
+            except Group.DoesNotExist:
+                raise CommandError(f'Нет группы {options["group"]!r}.')
+            posts = Post.objects.filter(group=group)
+
+        base_url = options['base_url']
+        records = export_records(
+            posts.order_by('-pub_date', '-id'),
+            comments=options['comments'],
+            image_url=(
+                (lambda url: base_url.rstrip('/') + url) if base_url else None
+            ),
+            chunk_size=options['chunk_size'],
+        )
+        output = (
+            open(options['output'], 'w', encoding='utf-8', newline='')
+            if options['output'] else self.stdout
+        )
+        try:
+            for line in export_lines(records, options['format']):
+                output.write(line)
+        finally:
+            if output is not self.stdout:
+                output.close()
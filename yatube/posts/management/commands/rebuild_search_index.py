@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        totals = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Проиндексировано: постов {posts}, '
+            'комментариев {comments}.'.format(**totals)
+        ))
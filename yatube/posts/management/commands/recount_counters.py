@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и комментариев пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк пересчитывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        totals = recount(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Пересчитано: постов {posts}, групп {groups}, '
+            'пользователей {users}.'.format(**totals)
+        ))
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import rebuild_derived
+from posts.synthetic import IMAGE_DIR, Generator, SyntheticDataError
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами '
+        'с картинками, комментариями и подписками с популярностью по '
+        'закону Ципфа. Одинаковое зерно даёт одинаковый набор. '
+        f'Картинки сохраняются в MEDIA_ROOT/{IMAGE_DIR}.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Начало имён пользователей и slug групп.',
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=20000,
+            help='Сколько строк вставлять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        if options['zipf'] <= 0:
+            raise CommandError('--zipf должен быть больше нуля.')
+        generator = Generator(
+            seed=options['seed'],
+            prefix=options['prefix'],
+            zipf=options['zipf'],
+            image_share=options['image_share'],
+            batch_size=options['batch_size'],
+            progress=self.progress,
+        )
+        started = time.monotonic()
+        try:
+            counts = generator.generate(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+            )
+        except SyntheticDataError as error:
+            raise CommandError(error)
+        if not options['skip_rebuild']:
+            self.stdout.write('Пересчёт счётчиков, лент и поиска...')
+            rebuild_derived(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: {} за {:.0f} с.'.format(
+                ', '.join(f'{table} {count}'
+                          for table, count in counts.items()),
+                time.monotonic() - started,
+            )
+        ))
+
+    def progress(self, table, inserted, seconds):
+        rate = inserted / seconds if seconds else inserted
+        self.stdout.write(f'{table}: {inserted}, {rate:.0f} в секунду.')
@@ -0,0 +1,110 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from posts import bench, soak
+
+SIZES = ('users', 'groups', 'posts', 'comments', 'follows')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает приложение смесью чтения и записи из нескольких потоков '
+        'и процессов во временной базе. Показывает по окнам времени '
+        'пропускную способность, ошибки, в том числе «database is locked», '
+        'задержки p50/p99 и память процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=60)
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Потоков в каждом процессе.',
+        )
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Длина окна отчёта в секундах.',
+        )
+        parser.add_argument(
+            '--mix',
+            default=','.join(f'{name}={weight}'
+                             for name, weight in soak.MIX.items()),
+            help='Веса операций, например index=90,add_comment=10. '
+                 'Операции: ' + ', '.join(soak.MIX) + '.',
+        )
+        parser.add_argument(
+            '--user-share', type=float, default=0.1,
+            help='Доля чтений от вошедшего пользователя.',
+        )
+        parser.add_argument(
+            '--max-memory-growth', type=float,
+            help='Завершиться с ошибкой, если память выросла больше, '
+                 'чем на столько МБ.',
+        )
+        parser.add_argument('--json', help='Файл для отчёта в JSON.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            mix = soak.parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+        if options['threads'] < 1 or options['processes'] < 1:
+            raise CommandError('Нужен хотя бы один поток и процесс.')
+
+        with bench.temporary_database():
+            bench.seed(
+                seed=options['seed'],
+                **{size: options[size] for size in SIZES},
+            )
+            workload = soak.Workload(mix, options['user_share'])
+            # С DEBUG каждый запрос к базе копится в памяти.
+            with override_settings(DEBUG=False):
+                report = soak.run(
+                    workload, options['seconds'],
+                    threads=options['threads'],
+                    processes=options['processes'],
+                    interval=options['interval'],
+                    seed=options['seed'],
+                )
+
+        for window in report['timeline']:
+            self.stdout.write(
+                '{second:>6.0f} с: {rps:>8.1f} запр/с, ошибок {errors} '
+                '(locked {locked}), p50 {p50_ms:>8.2f} p99 {p99_ms:>8.2f} мс, '
+                'память {rss_mb} МБ'.format(**window)
+            )
+        self.stdout.write('\nПо операциям:')
+        for name, stats in report['operations'].items():
+            self.stdout.write(
+                '{:<14} {requests:>7} запросов, {rps:>8.1f}/с, '
+                'ошибок {errors} (locked {locked}), '
+                'p50 {p50_ms:>8.2f} p95 {p95_ms:>8.2f} '
+                'p99 {p99_ms:>8.2f} мс'.format(name, **stats)
+            )
+        growth = report['memory_growth_mb']
+        self.stdout.write(f'\nРост памяти после первого окна: {growth} МБ.')
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump(
+                    {'options': {key: options[key] for key in (
+                        'seconds', 'threads', 'processes', 'interval',
+                        'user_share', 'seed', *SIZES)},
+                     'mix': mix, **report},
+                    output, indent=2, sort_keys=True, ensure_ascii=False)
+                output.write('\n')
+        limit = options['max_memory_growth']
+        if limit is not None and growth > limit:
+            raise CommandError(
+                f'Память выросла на {growth} МБ, допустимо {limit} МБ.')
@@ -0,0 +1,93 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    subquery = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставляет первую из повторяющихся подписок: иначе unique_follows
+    не создать."""
+    Follow = apps.get_model('posts', 'Follow')
+    schema_editor.execute(
+        'DELETE FROM {follow} WHERE user_id IS NOT NULL '
+        'AND author_id IS NOT NULL AND id NOT IN ('
+        '  SELECT MIN(id) FROM {follow} GROUP BY user_id, author_id'
+        ')'.format(follow=Follow._meta.db_table)
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    Post.objects.update(comments_count=_count(Comment.objects.all(), 'post'))
+    Group.objects.update(
+        posts_count=_count(Post.objects.all(), 'group'),
+        comments_count=_count(Comment.objects.all(), 'post__group'),
+    )
+    schema_editor.execute(
+        'INSERT INTO {stats} (user_id, posts_count, comments_count) '
+        'SELECT {pk}, 0, 0 FROM {users}'.format(
+            stats=UserStats._meta.db_table,
+            pk=User._meta.pk.column,
+            users=User._meta.db_table,
+        )
+    )
+    UserStats.objects.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        comments_count=_count(Comment.objects.all(), 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0002_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follows'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
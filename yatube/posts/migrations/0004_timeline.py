@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """Как timeline.fill: не больше TIMELINE_BACKFILL последних постов
+    на подписку, пачками по BATCH_SIZE подписок."""
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    sql = (
+        'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+        'SELECT user_id, post_id, pub_date FROM ('
+        '  SELECT f.user_id, p.id AS post_id, p.pub_date, ROW_NUMBER() OVER ('
+        '    PARTITION BY f.id ORDER BY p.pub_date DESC, p.id DESC'
+        '  ) AS number'
+        '  FROM {follow} f JOIN {post} p ON p.author_id = f.author_id'
+        '  WHERE f.id BETWEEN %s AND %s AND f.user_id IS NOT NULL'
+        ') WHERE number <= %s'
+    ).format(
+        timeline=TimelineEntry._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+    )
+    follows = Follow.objects.using(
+        schema_editor.connection.alias).order_by('pk')
+    last_pk = 0
+    while True:
+        pks = list(
+            follows.filter(pk__gt=last_pk)
+            .values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not pks:
+            return
+        schema_editor.execute(
+            sql, [pks[0], pks[-1], settings.TIMELINE_BACKFILL])
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
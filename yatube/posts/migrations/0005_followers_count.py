@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    followers = Follow.objects.filter(author=OuterRef('pk')).order_by().values(
+        'author'
+    ).annotate(total=Count('pk')).values('total')
+    UserStats.objects.update(followers_count=Coalesce(
+        Subquery(followers, output_field=IntegerField()), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
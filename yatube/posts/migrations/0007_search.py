@@ -0,0 +1,33 @@
+from django.db import migrations
+
+CREATE = """
+CREATE VIRTUAL TABLE posts_search USING fts5(
+    text,
+    post_id UNINDEXED,
+    comment_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+FILL = [
+    """
+    INSERT INTO posts_search (rowid, text, post_id, comment_id)
+    SELECT 2 * id, text, id, NULL FROM posts_post
+    """,
+    """
+    INSERT INTO posts_search (rowid, text, post_id, comment_id)
+    SELECT 2 * id + 1, text, post_id, id FROM posts_comment
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE, 'DROP TABLE posts_search'),
+        migrations.RunSQL(FILL, migrations.RunSQL.noop),
+    ]
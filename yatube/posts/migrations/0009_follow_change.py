@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveIntegerField()),
+                ('author_id', models.PositiveIntegerField()),
+                ('followed', models.BooleanField()),
+            ],
+        ),
+    ]
@@ -1,15 +1,24 @@
+import sqlite3
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.signals import post_delete, post_save
 
 from core.models import CreatedModel
+from core.sqlite import chunks
 
 User = get_user_model()
 
+# INSERT/DELETE ... RETURNING поддерживается с SQLite 3.35.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=60, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -33,9 +42,24 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -54,10 +78,137 @@ class Comment(CreatedModel):
     )
     text = models.TextField()
 
+    class Meta:
+        ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
 
+def _ids(objects):
+    return {getattr(obj, 'pk', obj) for obj in objects}
+
+
+class FollowManager(models.Manager):
+    """Подписки и отписки одним запросом на пачку авторов.
+
+    Повторная подписка и отписка от того, на кого не подписан, ничего
+    не меняют: дубликаты отсекает ограничение unique_follows, а
+    RETURNING возвращает только изменённые строки. Для них отправляются
+    post_save и post_delete, как при save() и delete(), — сигналы
+    обновляют счётчики, ленты и версии кеша.
+
+    RETURNING есть в SQLite с 3.35; на более старой версии изменённые
+    строки выбираются отдельными запросами под блокировкой записи.
+    """
+
+    def _sql(self, sql, chunk):
+        return sql.format(
+            follow=self.model._meta.db_table,
+            user=User._meta.db_table,
+            ids=', '.join(['%s'] * len(chunk)),
+        )
+
+    def _lock(self, cursor, user_id, chunk):
+        # UPDATE без изменений берёт блокировку записи до конца
+        # транзакции: выбранные дальше строки не изменит другой процесс.
+        cursor.execute(self._sql(
+            'UPDATE {follow} SET user_id = user_id '
+            'WHERE user_id = %s AND author_id IN ({ids})', chunk,
+        ), [user_id, *chunk])
+
+    def _select(self, cursor, user_id, chunk):
+        cursor.execute(self._sql(
+            'SELECT id, author_id FROM {follow} '
+            'WHERE user_id = %s AND author_id IN ({ids})', chunk,
+        ), [user_id, *chunk])
+        return cursor.fetchall()
+
+    def _insert(self, cursor, user_id, chunk):
+        if HAS_RETURNING:
+            cursor.execute(self._sql(
+                'INSERT INTO {follow} (user_id, author_id) '
+                'SELECT %s, id FROM {user} WHERE id IN ({ids}) '
+                'ON CONFLICT DO NOTHING RETURNING id, author_id', chunk,
+            ), [user_id, *chunk])
+            return cursor.fetchall()
+        self._lock(cursor, user_id, chunk)
+        cursor.execute(self._sql(
+            'SELECT id FROM {user} WHERE id IN ({ids})', chunk), chunk)
+        authors = [author_id for author_id, in cursor.fetchall()]
+        existing = {author_id for _, author_id in
+                    self._select(cursor, user_id, chunk)}
+        new = [author_id for author_id in authors
+               if author_id not in existing]
+        if not new:
+            return []
+        self.bulk_create([
+            self.model(user_id=user_id, author_id=author_id)
+            for author_id in new
+        ], ignore_conflicts=True)
+        return self._select(cursor, user_id, new)
+
+    def _delete(self, cursor, user_id, chunk):
+        if HAS_RETURNING:
+            cursor.execute(self._sql(
+                'DELETE FROM {follow} WHERE user_id = %s '
+                'AND author_id IN ({ids}) RETURNING id, author_id', chunk,
+            ), [user_id, *chunk])
+            return cursor.fetchall()
+        self._lock(cursor, user_id, chunk)
+        rows = self._select(cursor, user_id, chunk)
+        if rows:
+            pks = [pk for pk, _ in rows]
+            cursor.execute(self._sql(
+                'DELETE FROM {follow} WHERE id IN ({ids})', pks), pks)
+        return rows
+
+    def _execute(self, rows, user, author_ids):
+        """Подписки из строк (id, author_id), которые `rows(cursor,
+        user_id, пачка)` вернула для пачек `author_ids`."""
+        using = router.db_for_write(self.model)
+        follows = []
+        with connections[using].cursor() as cursor:
+            for chunk in chunks(author_ids):
+                for pk, author_id in rows(cursor, user.pk, chunk):
+                    follow = self.model(
+                        pk=pk, user_id=user.pk, author_id=author_id)
+                    follow._state.adding = False
+                    follow._state.db = using
+                    follows.append(follow)
+        return follows
+
+    def follow(self, user, authors):
+        """Подписывает `user` на `authors` (пользователи или их id);
+        несуществующие авторы и сам `user` пропускаются. Возвращает
+        новые подписки."""
+        author_ids = _ids(authors) - {user.pk}
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            follows = self._execute(self._insert, user, sorted(author_ids))
+            for follow in follows:
+                post_save.send(
+                    sender=self.model, instance=follow, created=True,
+                    update_fields=None, raw=False, using=follow._state.db)
+        return follows
+
+    def unfollow(self, user, authors):
+        """Отписывает `user` от `authors`. Возвращает удалённые
+        подписки."""
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            follows = self._execute(self._delete, user, sorted(_ids(authors)))
+            for follow in follows:
+                post_delete.send(
+                    sender=self.model, instance=follow,
+                    using=follow._state.db)
+        return follows
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -72,6 +223,8 @@ class Follow(models.Model):
         null=True,
     )
 
+    objects = FollowManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -79,3 +232,72 @@ class Follow(models.Model):
                 name='unique_follows',
             ),
         ]
+
+
+class FollowChange(models.Model):
+    """Журнал подписок и отписок для графа подписок в памяти
+    (`follow_graph`): процессы дочитывают из него чужие изменения.
+
+    Пишется в одной транзакции с подпиской, id растут в порядке
+    коммитов (SQLite пишет последовательно). Пользователи хранятся
+    числами: запись переживает удаление пользователя.
+    """
+    user_id = models.PositiveIntegerField()
+    author_id = models.PositiveIntegerField()
+    followed = models.BooleanField()
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя (fan-out при публикации)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики постов, комментариев и подписчиков пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько записей источника уже загружено `import_data`.
+
+    Обновляется в одной транзакции с загруженной пачкой, поэтому
+    повторный запуск после сбоя продолжает ровно с места остановки.
+    """
+    source = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.source}: {self.position}'
@@ -0,0 +1,196 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Индекс — виртуальная таблица posts_search (миграция 0007_search).
+Строка поста имеет rowid = 2 * id, строка комментария — 2 * id + 1,
+поэтому обновление строки не требует поиска по индексу. Индекс
+поддерживается сигналами, с нуля его строит команда
+`manage.py rebuild_search_index`.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from core.sqlite import MAX_PARAMS, chunks
+
+from .models import Comment, Post
+from .utils import pk_batches
+
+TABLE = 'posts_search'
+# Совпадение в комментарии весит меньше совпадения в тексте поста.
+COMMENT_WEIGHT = 0.5
+MAX_TERMS = 8
+
+WORD = re.compile(r'\w+')
+
+
+def match_query(text):
+    """Запрос пользователя в синтаксисе FTS5: все слова обязательны,
+    последнее можно не дописывать."""
+    terms = WORD.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return ''
+    return ' '.join('"%s"' % term for term in terms) + '*'
+
+
+def _replace(rowid, text, post_id, comment_id=None):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, post_id, comment_id) '
+            'VALUES (%s, %s, %s, %s)',
+            [rowid, text, post_id, comment_id],
+        )
+
+
+def _delete(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+
+
+def index_post(post):
+    _replace(2 * post.pk, post.text, post.pk)
+
+
+def index_comment(comment):
+    _replace(2 * comment.pk + 1, comment.text, comment.post_id, comment.pk)
+
+
+def remove_post(post_id):
+    _delete(2 * post_id)
+
+
+def remove_comment(comment_id):
+    _delete(2 * comment_id + 1)
+
+
+def index_posts(post_ids, batch_size=MAX_PARAMS // 2):
+    """Индексирует заново посты post_ids вместе с их комментариями,
+    пачками по batch_size постов в транзакции. Нужна после загрузки
+    данных в обход сигналов."""
+    # id передаются в запрос дважды
+    for pks in chunks(sorted(post_ids), min(batch_size, MAX_PARAMS // 2)):
+        marks = ', '.join(['%s'] * len(pks))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid IN ('
+                f'  SELECT 2 * id FROM posts_post WHERE id IN ({marks})'
+                f'  UNION ALL SELECT 2 * id + 1 FROM posts_comment'
+                f'  WHERE post_id IN ({marks}))',
+                pks + pks,
+            )
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, text, post_id, comment_id) '
+                f'SELECT 2 * id, text, id, NULL FROM posts_post '
+                f'WHERE id IN ({marks}) '
+                f'UNION ALL SELECT 2 * id + 1, text, post_id, id '
+                f'FROM posts_comment WHERE post_id IN ({marks})',
+                pks + pks,
+            )
+
+
+def rebuild(batch_size=1000):
+    """Строит индекс заново пачками по первичному ключу.
+
+    Индекс не очищается заранее: в транзакции каждой пачки удаляются
+    и вставляются заново строки её диапазона id, поэтому поиск во время
+    перестроения отвечает по старым строкам ещё не дошедших пачек.
+
+    Возвращает количество проиндексированных постов и комментариев.
+    """
+    totals = {'posts': 0, 'comments': 0}
+    # (название, queryset, SELECT строк индекса, остаток rowid по модулю 2)
+    sources = (
+        ('posts', Post.objects.all(),
+         'SELECT 2 * id, text, id, NULL FROM posts_post', 0),
+        ('comments', Comment.objects.all(),
+         'SELECT 2 * id + 1, text, post_id, id FROM posts_comment', 1),
+    )
+    delete = f'DELETE FROM {TABLE} WHERE rowid %% 2 = %s AND rowid > %s'
+    for name, queryset, select, parity in sources:
+        previous = -1
+        for pks in pk_batches(queryset, batch_size):
+            first, last = pks[0], pks[-1]
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Вместе с диапазоном удаляются и строки записей,
+                # удалённых между пачками.
+                cursor.execute(delete + ' AND rowid <= %s', [
+                    parity, 2 * previous + parity, 2 * last + parity])
+                cursor.execute(
+                    f'INSERT INTO {TABLE} (rowid, text, post_id, comment_id) '
+                    f'{select} WHERE id BETWEEN %s AND %s',
+                    [first, last],
+                )
+            totals[name] += len(pks)
+            previous = last
+        with connection.cursor() as cursor:
+            # Строки записей после последней пачки.
+            cursor.execute(delete, [parity, 2 * previous + parity])
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return totals
+
+
+def matching_posts(text):
+    """Подзапрос id постов, в тексте которых есть все слова запроса;
+    для `filter(pk__in=...)`."""
+    return RawSQL(
+        f'SELECT post_id FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s AND comment_id IS NULL',
+        [match_query(text)],
+    )
+
+
+class SearchResults:
+    """Посты, найденные по тексту поста или его комментариев.
+
+    Упорядочены по релевантности (bm25 лучшего совпадения) и читаются
+    курсорной пагинацией по ключу (rank, id), см. `keyset`.
+    """
+
+    key_type = float
+
+    def __init__(self, text):
+        self.query = match_query(text)
+
+    def __bool__(self):
+        return bool(self.query)
+
+    @staticmethod
+    def cursor_key(post):
+        return post.search_rank, post.pk
+
+    def keyset(self, key, reverse, limit):
+        if not self.query:
+            return []
+        order = 'DESC' if reverse else 'ASC'
+        having, params = '', [COMMENT_WEIGHT, self.query]
+        if key is not None:
+            sign = '<' if reverse else '>'
+            having = (
+                f'HAVING best {sign} %s OR (best = %s AND post_id {sign} %s)'
+            )
+            params += [key[0], key[0], key[1]]
+        # bm25() нельзя вызвать под агрегатом, а скрытый столбец rank
+        # (тот же bm25) можно.
+        sql = (
+            'SELECT post_id, MIN(score) AS best FROM ('
+            '  SELECT post_id, rank * CASE WHEN comment_id IS NULL'
+            '  THEN 1.0 ELSE %s END AS score'
+            f'  FROM {TABLE} WHERE {TABLE} MATCH %s'
+            f') GROUP BY post_id {having} '
+            f'ORDER BY best {order}, post_id {order} LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            ranked = cursor.fetchall()
+
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in ranked])
+        results = []
+        for pk, score in ranked:
+            # Индекс не чистится при flush в тестах и т.п.
+            if pk in posts:
+                posts[pk].search_rank = score
+                results.append(posts[pk])
+        return results
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import counters, follow_graph, search, timeline, versions
+from .models import Comment, Follow, Group, Post
+from .versions import post_scopes
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+    old_group_id = instance._initial_group_id
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        counters.change_group(instance.group_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+        timeline.forget_recent(instance.author_id)
+    elif old_group_id != instance.group_id:
+        counters.change_group(old_group_id, 'posts_count', -1)
+        counters.change_group(instance.group_id, 'posts_count', 1)
+        moved = instance.comments_count
+        if moved:
+            counters.change_group(old_group_id, 'comments_count', -moved)
+            counters.change_group(instance.group_id, 'comments_count', moved)
+    versions.bump(*post_scopes(instance, old_group_id, instance.group_id))
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, 'posts_count', -1)
+    timeline.forget_recent(instance.author_id)
+    search.remove_post(instance.pk)
+    versions.bump(*post_scopes(instance, instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, update_fields=None,
+                  **kwargs):
+    if raw:
+        return
+    if update_fields is None or 'text' in update_fields:
+        search.index_comment(instance)
+    if created:
+        counters.change_post(instance.post_id, 'comments_count', 1)
+        counters.change_user(instance.author_id, 'comments_count', 1)
+        counters.change_post_group(instance.post_id, 'comments_count', 1)
+    versions.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, 'comments_count', -1)
+    counters.change_user(instance.author_id, 'comments_count', -1)
+    counters.change_post_group(instance.post_id, 'comments_count', -1)
+    search.remove_comment(instance.pk)
+    versions.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    # Ссылки на группу есть во всех лентах.
+    if not raw:
+        versions.bump('groups', f'group:{instance.pk}')
+
+
+def _follow_changed(follow, created):
+    versions.bump(
+        f'follows:{follow.user_id}', f'followers:{follow.author_id}')
+    if follow.user_id is not None and follow.author_id is not None:
+        follow_graph.record(follow.user_id, follow.author_id, created)
+        # Граф в памяти хранит только закоммиченные подписки.
+        transaction.on_commit(follow_graph.graph.changed)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        _follow_changed(instance, True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    timeline.remove(instance.user_id, instance.author_id)
+    timeline.fill_if_demoted(instance.author_id)
+    _follow_changed(instance, False)
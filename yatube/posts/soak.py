@@ -0,0 +1,320 @@
+"""Нагрузочный прогон смеси чтения и записи: `manage.py soak`.
+
+В отличие от bench, запросы идут одновременно из нескольких потоков
+и процессов: так видны блокировки SQLite при всплесках add_comment и
+post_create на фоне чтения ленты. Запросы проходят через WSGIHandler
+в том же процессе, каждый поток — отдельный пользователь.
+
+Результат копится по окнам времени в `interval` секунд: запросы,
+ошибки 5xx и среди них «database is locked», задержки и память (RSS)
+процессов. Так видно, как система ведёт себя по ходу прогона —
+растут ли хвосты задержек и память, — а не только итог.
+"""
+import multiprocessing
+import random
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connections
+from django.db.models import F
+from django.test import RequestFactory
+from django.urls import reverse
+
+from core.sqlite import is_busy
+
+from .bench import REMOTE_ADDR, percentiles, session_cookie
+from .models import Group, Post, User
+from .synthetic import WORDS
+
+MIX = {
+    'index': 70,
+    'group_posts': 5,
+    'profile': 5,
+    'post_detail': 8,
+    'follow_index': 2,
+    'add_comment': 6,
+    'post_create': 3,
+    'follow': 1,
+}
+# Постоянный токен в cookie и в форме проходит проверку CSRF.
+CSRF_TOKEN = 'soak' * 8
+# Сколько свежих постов читают и комментируют.
+HOT_POSTS = 1000
+
+_local = threading.local()
+
+
+def parse_mix(value):
+    """'index=80,add_comment=20' -> {'index': 80, 'add_comment': 20}."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in MIX:
+            raise ValueError(f'Неизвестная операция {name!r}.')
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError('Сумма весов должна быть больше нуля.')
+    return mix
+
+
+def rss():
+    """Текущая память процесса (RSS) в байтах."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Без /proc есть только пик памяти, в килобайтах.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _window(started, interval):
+    return int((time.monotonic() - started) // interval)
+
+
+def _sample():
+    return {'latencies': [], 'errors': 0, 'locked': 0}
+
+
+def _add(samples, other):
+    """Добавляет замеры {операция: замер} из `other` к `samples`."""
+    for name, sample in other.items():
+        target = samples.setdefault(name, _sample())
+        target['latencies'] += sample['latencies']
+        target['errors'] += sample['errors']
+        target['locked'] += sample['locked']
+
+
+def _remember_exception(sender, **kwargs):
+    # Вызывается внутри except обработчика запроса.
+    _local.error = sys.exc_info()[1]
+
+
+class Workload:
+    """Запросы операций смеси на данных из базы."""
+
+    def __init__(self, mix=MIX, user_share=0.1):
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.user_share = user_share
+        self.factory = RequestFactory(
+            HTTP_HOST='localhost', REMOTE_ADDR=REMOTE_ADDR)
+        self.post_ids = list(Post.objects.order_by('-pub_date').values_list(
+            'pk', flat=True)[:HOT_POSTS])
+        # Популярные авторы: их профили читают и на них подписываются.
+        self.usernames = list(User.objects.order_by(
+            F('stats__followers_count').desc(nulls_last=True), 'pk',
+        ).values_list('username', flat=True)[:100])
+        self.slugs = list(Group.objects.values_list('slug', flat=True)[:100])
+
+    def text(self, rng):
+        return ' '.join(rng.choices(WORDS, k=rng.randint(3, 20)))
+
+    def request(self, name, rng):
+        """(путь, POST-данные или None, нужен ли вход) операции."""
+        if name == 'index':
+            return reverse('posts:index'), None, False
+        if name == 'group_posts' and self.slugs:
+            return reverse('posts:group_list', kwargs={
+                'slug': rng.choice(self.slugs)}), None, False
+        if name == 'profile':
+            return reverse('posts:profile', kwargs={
+                'username': rng.choice(self.usernames)}), None, False
+        if name == 'post_detail' and self.post_ids:
+            return reverse('posts:post_detail', kwargs={
+                'post_id': rng.choice(self.post_ids)}), None, False
+        if name == 'follow_index':
+            return reverse('posts:follow_index'), None, True
+        if name == 'add_comment' and self.post_ids:
+            return reverse('posts:add_comment', kwargs={
+                'post_id': rng.choice(self.post_ids)
+            }), {'text': self.text(rng)}, True
+        if name == 'post_create':
+            return reverse('posts:post_create'), {
+                'text': self.text(rng), 'group': ''}, True
+        if name == 'follow':
+            # GET подписки и отписки меняет данные.
+            view = rng.choice(('profile_follow', 'profile_unfollow'))
+            return reverse(f'posts:{view}', kwargs={
+                'username': rng.choice(self.usernames)}), None, True
+        return reverse('posts:index'), None, False
+
+    def environ(self, name, rng, cookie):
+        path, data, login = self.request(name, rng)
+        csrf = f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}'
+        if data is None:
+            environ = self.factory.get(path).environ
+        else:
+            data['csrfmiddlewaretoken'] = CSRF_TOKEN
+            environ = self.factory.post(path, data).environ
+        if login or rng.random() < self.user_share:
+            environ['HTTP_COOKIE'] = f'{cookie}; {csrf}'
+        else:
+            environ['HTTP_COOKIE'] = csrf
+        return environ
+
+
+class Recorder:
+    """Замеры одного потока по окнам: {окно: {операция: замер}}."""
+
+    def __init__(self, started, interval):
+        self.started = started
+        self.interval = interval
+        self.windows = defaultdict(dict)
+
+    def record(self, name, elapsed, status, error):
+        window = _window(self.started, self.interval)
+        sample = self.windows[window].setdefault(name, _sample())
+        sample['latencies'].append(elapsed)
+        if status >= 500:
+            sample['errors'] += 1
+            if isinstance(error, OperationalError) and is_busy(error):
+                sample['locked'] += 1
+
+
+def _worker(workload, handler, cookie, seed, deadline, recorder):
+    rng = random.Random(seed)
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(workload.names, workload.weights)[0]
+            environ = workload.environ(name, rng, cookie)
+            status = []
+            _local.error = None
+            started = time.perf_counter()
+            body = handler(
+                environ, lambda line, headers, *args: status.append(line))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                body.close()
+            recorder.record(
+                name, time.perf_counter() - started,
+                int(status[0].split()[0]), _local.error)
+    finally:
+        connections.close_all()
+
+
+def run_process(workload, cookies, seed, started, deadline, interval):
+    """Потоки одного процесса; возвращает (окна, память по окнам)."""
+    got_request_exception.connect(_remember_exception)
+    handler = WSGIHandler()
+    recorders = [Recorder(started, interval) for _ in cookies]
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(workload, handler, cookie, seed * 1000 + number,
+                  deadline, recorder),
+        )
+        for number, (cookie, recorder) in enumerate(zip(cookies, recorders))
+    ]
+    for thread in threads:
+        thread.start()
+    # Память к концу каждого окна: последний замер в окне.
+    memory = {_window(started, interval): rss()}
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(min(interval, 0.5))
+        memory[_window(started, interval)] = rss()
+    got_request_exception.disconnect(_remember_exception)
+    windows = defaultdict(dict)
+    for recorder in recorders:
+        for window, samples in recorder.windows.items():
+            _add(windows[window], samples)
+    return dict(windows), memory
+
+
+def _child(queue, *args):
+    queue.put(run_process(*args))
+
+
+def run(workload, seconds, threads=4, processes=1, interval=5, seed=1):
+    """Прогон на `processes` процессах по `threads` потоков.
+
+    Возвращает отчёт `summarize`.
+    """
+    users = list(User.objects.order_by('pk')[:threads * processes])
+    cookies = [session_cookie(user) for user in users]
+    cookies = [
+        cookies[(number * threads + thread) % len(cookies)]
+        for number in range(processes) for thread in range(threads)
+    ]
+    started = time.monotonic()
+    deadline = started + seconds
+    if processes == 1:
+        results = [
+            run_process(workload, cookies, seed, started, deadline, interval)
+        ]
+    else:
+        # Соединения с базой не должны достаться дочерним процессам.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        children = [
+            context.Process(target=_child, args=(
+                queue, workload, cookies[number::processes],
+                seed + number, started, deadline, interval))
+            for number in range(processes)
+        ]
+        for child in children:
+            child.start()
+        results = [queue.get() for _ in children]
+        for child in children:
+            child.join()
+    return summarize(results, interval, time.monotonic() - started)
+
+
+def _stats(sample, seconds):
+    latencies = sample['latencies']
+    stats = {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / seconds, 1),
+        'errors': sample['errors'],
+        'locked': sample['locked'],
+        'error_rate': round(sample['errors'] / max(len(latencies), 1), 4),
+    }
+    if latencies:
+        stats.update(percentiles(latencies))
+    return stats
+
+
+def summarize(results, interval, elapsed):
+    """Отчёт: итог по операциям, окна по времени и рост памяти."""
+    windows = defaultdict(dict)
+    memory = defaultdict(int)
+    growth = 0
+    for process_windows, process_memory in results:
+        for window, samples in process_windows.items():
+            _add(windows[window], samples)
+        for window, value in process_memory.items():
+            memory[window] += value
+        if process_memory:
+            first = process_memory[min(process_memory)]
+            growth += process_memory[max(process_memory)] - first
+
+    operations = {}
+    timeline = []
+    for window in sorted(windows):
+        _add(operations, windows[window])
+        total = {}
+        for sample in windows[window].values():
+            _add(total, {'all': sample})
+        seconds = min(interval, elapsed - window * interval) or interval
+        timeline.append({
+            'second': window * interval,
+            **_stats(total['all'], seconds),
+            'rss_mb': round(memory.get(window, 0) / 2 ** 20, 1),
+        })
+    return {
+        'operations': {
+            name: _stats(sample, elapsed)
+            for name, sample in sorted(operations.items())
+        },
+        'timeline': timeline,
+        'memory_growth_mb': round(growth / 2 ** 20, 1),
+    }
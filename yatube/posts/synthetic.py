@@ -0,0 +1,246 @@
+"""Синтетический набор данных в масштабе продакшена: `manage.py seed_data`.
+
+Миллионы строк не проходят через модели: кортежи значений
+вставляются `executemany` пачками, каждая пачка в своей транзакции.
+Одинаковое зерно (seed) даёт одинаковый набор; у каждой таблицы своё
+производное зерно, поэтому, например, число комментариев не меняет
+посты.
+
+Форма данных похожа на настоящую: популярность авторов распределена
+по закону Ципфа — немногие авторы пишут большую часть постов и
+собирают большую часть подписчиков, а комментарии достаются в
+основном свежим постам. Картинки — несколько JPEG, общих для всех
+постов с картинкой; они лежат отдельно от загруженных пользователями,
+в IMAGE_DIR внутри MEDIA_ROOT, и удаляются вместе с этим каталогом.
+
+Сигналы не срабатывают, поэтому после вставки счётчики, ленты и
+поисковый индекс пересчитывает `importer.rebuild_derived`.
+"""
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from .models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'кот', 'собака', 'погода', 'город', 'книга', 'музыка', 'работа',
+    'отпуск', 'море', 'горы', 'кофе', 'утро', 'вечер', 'друзья',
+)
+START = datetime(2020, 1, 1)
+IMAGES = 8
+IMAGE_DIR = 'posts/synthetic'
+IMAGE_SIZE = (960, 540)
+
+
+class SyntheticDataError(Exception):
+    pass
+
+
+def zipf_rank(rng, count, exponent):
+    """Номер от 0 до count - 1 с вероятностью ~ 1 / (номер + 1) ** exponent.
+
+    Обращение функции распределения непрерывного приближения: O(1)
+    по памяти, тогда как random.choices держал бы веса всех элементов.
+    """
+    share = rng.random()
+    if exponent == 1:
+        value = (count + 1) ** share
+    else:
+        power = 1 - exponent
+        value = (((count + 1) ** power - 1) * share + 1) ** (1 / power)
+    return min(int(value) - 1, count - 1)
+
+
+def insert_rows(model, fields, rows, batch_size, progress=None):
+    """Вставляет кортежи значений полей `fields`; возвращает их число."""
+    quote = connection.ops.quote_name
+    meta = model._meta
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(meta.db_table),
+        ', '.join(quote(meta.get_field(name).column) for name in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    total = 0
+    started = time.monotonic()
+    batch = []
+    rows = iter(rows)
+    while True:
+        batch.clear()
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                break
+        if not batch:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        total += len(batch)
+        if progress:
+            progress(meta.model_name, total,
+                     time.monotonic() - started)
+    return total
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Generator:
+    """Набор данных из `seed`; имена пользователей и slug групп
+    начинаются с `prefix`, чтобы набор можно было добавить к базе."""
+
+    def __init__(self, seed=1, prefix='user', zipf=1.1, image_share=0.2,
+                 batch_size=20000, progress=None):
+        self.seed = seed
+        self.prefix = prefix
+        self.zipf = zipf
+        self.image_share = image_share
+        self.batch_size = batch_size
+        self.progress = progress
+        self.start = timezone.make_aware(START, timezone.utc)
+
+    def rng(self, table):
+        return random.Random(f'{self.seed}:{table}')
+
+    def date(self, minutes):
+        return connection.ops.adapt_datetimefield_value(
+            self.start + timedelta(minutes=minutes))
+
+    def text(self, rng):
+        return ' '.join(rng.choices(WORDS, k=rng.randint(5, 40)))
+
+    def images(self):
+        """Пути картинок в хранилище; уже созданные не перезаписываются."""
+        rng = self.rng('images')
+        names = []
+        for number in range(IMAGES):
+            name = f'{IMAGE_DIR}/{self.seed}-{number}.jpg'
+            color = tuple(rng.randrange(256) for _ in range(3))
+            if not default_storage.exists(name):
+                content = io.BytesIO()
+                Image.new('RGB', IMAGE_SIZE, color).save(content, 'JPEG')
+                name = default_storage.save(
+                    name, ContentFile(content.getvalue()))
+            names.append(name)
+        return names
+
+    def generate(self, users, groups, posts, comments, follows):
+        """Создаёт набор; `follows` — среднее число подписок
+        пользователя. Возвращает число вставленных строк по таблицам."""
+        if users < 2:
+            raise SyntheticDataError('Нужно хотя бы два пользователя.')
+        if User.objects.filter(username=f'{self.prefix}0').exists():
+            raise SyntheticDataError(
+                f'Пользователи с префиксом {self.prefix!r} уже есть.')
+        first_user = _next_id(User)
+        first_group = _next_id(Group)
+        first_post = _next_id(Post)
+        # Место в рейтинге популярности -> номер пользователя.
+        popular = list(range(users))
+        self.rng('popularity').shuffle(popular)
+        self.popular_ids = [first_user + number for number in popular[:10]]
+
+        counts = {'users': insert_rows(
+            User,
+            ('id', 'password', 'is_superuser', 'username', 'first_name',
+             'last_name', 'email', 'is_staff', 'is_active', 'date_joined'),
+            self.user_rows(users, first_user),
+            self.batch_size, self.progress,
+        )}
+        counts['groups'] = insert_rows(
+            Group,
+            ('id', 'title', 'slug', 'description', 'posts_count',
+             'comments_count'),
+            self.group_rows(groups, first_group),
+            self.batch_size, self.progress,
+        )
+        counts['posts'] = insert_rows(
+            Post,
+            ('id', 'text', 'pub_date', 'author', 'group', 'image',
+             'comments_count'),
+            self.post_rows(posts, first_post, first_user, popular, groups,
+                           first_group),
+            self.batch_size, self.progress,
+        )
+        counts['comments'] = insert_rows(
+            Comment,
+            ('post', 'author', 'text', 'created'),
+            self.comment_rows(comments, posts, first_post, users,
+                              first_user),
+            self.batch_size, self.progress,
+        )
+        counts['follows'] = insert_rows(
+            Follow,
+            ('user', 'author'),
+            self.follow_rows(follows, users, first_user, popular),
+            self.batch_size, self.progress,
+        )
+        return counts
+
+    def user_rows(self, users, first_id):
+        password = make_password(None)
+        joined = self.date(0)
+        for number in range(users):
+            yield (first_id + number, password, False,
+                   f'{self.prefix}{number}', f'Автор {number}', '', '',
+                   False, True, joined)
+
+    def group_rows(self, groups, first_id):
+        for number in range(groups):
+            yield (first_id + number, f'Группа {number}',
+                   f'{self.prefix}-{number}', 'Синтетическая группа', 0, 0)
+
+    def post_rows(self, posts, first_id, first_user, popular, groups,
+                  first_group):
+        rng = self.rng('posts')
+        images = self.images() if posts and self.image_share else []
+        for number in range(posts):
+            author = popular[zipf_rank(rng, len(popular), self.zipf)]
+            group = (
+                first_group + zipf_rank(rng, groups, self.zipf)
+                if groups and rng.random() < 0.5 else None
+            )
+            image = (
+                rng.choice(images)
+                if images and rng.random() < self.image_share else ''
+            )
+            # Посты идут по минуте: id растёт вместе с pub_date.
+            yield (first_id + number, self.text(rng), self.date(number),
+                   first_user + author, group, image, 0)
+
+    def comment_rows(self, comments, posts, first_post, users, first_user):
+        if not posts:
+            return
+        rng = self.rng('comments')
+        for _ in range(comments):
+            # Чаще всего комментируют свежие посты.
+            post = posts - 1 - zipf_rank(rng, posts, self.zipf)
+            yield (first_post + post, first_user + rng.randrange(users),
+                   self.text(rng),
+                   self.date(post + rng.randint(1, 24 * 60)))
+
+    def follow_rows(self, follows, users, first_user, popular):
+        if not follows:
+            return
+        rng = self.rng('follows')
+        for number in range(users):
+            wanted = min(users - 1, int(rng.expovariate(1 / follows)))
+            authors = set()
+            # Популярных авторов выпадает много: ограничиваем попытки.
+            for _ in range(wanted * 4):
+                if len(authors) == wanted:
+                    break
+                author = popular[zipf_rank(rng, users, self.zipf)]
+                if author != number:
+                    authors.add(author)
+            for author in sorted(authors):
+                yield first_user + number, first_user + author
@@ -0,0 +1,18 @@
+from django import template
+
+from .. import thumbnails
+from ..fragments import render_articles
+
+register = template.Library()
+
+
+@register.simple_tag
+def article_fragments(posts):
+    return render_articles(posts)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Миниатюры всех постов списка одним чтением key-value store:
+    `{% prefetch_thumbnails page_obj as posts %}`."""
+    return thumbnails.prefetch(list(posts))
@@ -0,0 +1,116 @@
+from datetime import datetime
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import constant_queries_report
+
+from ..models import Follow, Group, Post, User
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.admin = User.objects.create_superuser(
+            'admin_user', 'admin@example.com', 'password')
+        cls.author = User.objects.create_user(username='admin_author')
+        cls.group = Group.objects.create(
+            title='Выбранная группа',
+            slug='admin-group',
+            description='Группа поста',
+        )
+        cls.post = Post.objects.create(
+            text='Пост в админке',
+            author=cls.author,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.admin_client = Client()
+        self.admin_client.force_login(AdminTests.admin)
+
+    def test_post_changelist_does_not_list_every_group(self):
+        """В редактируемом столбце группы нет списка всех групп."""
+        for number in range(3):
+            Group.objects.create(
+                title='Другая группа %s' % number,
+                slug='other-admin-group-%s' % number,
+                description='Ещё одна группа',
+            )
+
+        response = self.admin_client.get(
+            reverse('admin:posts_post_changelist'))
+
+        self.assertContains(response, 'Выбранная группа')
+        self.assertNotContains(response, 'Другая группа')
+
+    def test_large_table_count_is_estimated(self):
+        """Без фильтров большая таблица не считается через COUNT."""
+        url = reverse('admin:posts_post_changelist')
+        with override_settings(ADMIN_EXACT_COUNT_LIMIT=0), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        counts = [
+            query['sql'] for query in queries.captured_queries
+            if 'COUNT(' in query['sql'] and 'posts_post' in query['sql']
+        ]
+        self.assertEqual(counts, [])
+
+    def test_published_filter(self):
+        """Фильтр по году и месяцу отбирает посты диапазоном дат."""
+        old_post = Post.objects.create(text='Старый пост', author=self.author)
+        Post.objects.filter(pk=old_post.pk).update(
+            pub_date=timezone.make_aware(datetime(2020, 5, 17)))
+        url = reverse('admin:posts_post_changelist')
+
+        for value, expected in (
+            ('2020', [old_post.pk]),
+            ('2020-05', [old_post.pk]),
+            ('2020-06', []),
+            ('неправильно', []),
+        ):
+            with self.subTest(value=value):
+                response = self.admin_client.get(url, {'published': value})
+                self.assertEqual(
+                    [post.pk for post in response.context['cl'].result_list],
+                    expected,
+                )
+
+    def test_follow_changelist_queries_do_not_grow(self):
+        """Список подписок не загружает всех пользователей."""
+        url = reverse('admin:posts_follow_changelist')
+
+        def grow(size):
+            while User.objects.count() < size:
+                number = User.objects.count()
+                user = User.objects.create_user(username='reader_%s' % number)
+                Follow.objects.create(user=user, author=AdminTests.author)
+
+        def render():
+            self.admin_client.get(url)
+
+        report = constant_queries_report(render, grow, sizes=(4, 8))
+        self.assertIsNone(report, report)
+
+    def test_follow_search_by_username(self):
+        reader = User.objects.create_user(username='admin_reader')
+        follow = Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(
+            user=User.objects.create_user(username='someone_else'),
+            author=AdminTests.admin,
+        )
+
+        response = self.admin_client.get(
+            reverse('admin:posts_follow_changelist'), {'q': 'admin_reader'})
+
+        self.assertEqual(
+            [item.pk for item in response.context['cl'].result_list],
+            [follow.pk],
+        )
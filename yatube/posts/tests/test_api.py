@@ -0,0 +1,163 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import constant_queries_report
+
+from .. import api_urls
+from ..models import Comment, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа API',
+            slug='api-group',
+            description='Группа',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text='Пост %s' % number,
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+        cls.post = cls.posts[-1]
+
+    def setUp(self):
+        self.client = Client()
+
+    def get(self, name, *args, **params):
+        response = self.client.get(reverse('api:' + name, args=args), params)
+        return response, response.json()
+
+    def walk(self, name, *args, **params):
+        """Все страницы ленты по курсорам next."""
+        results = []
+        data = {'next': ''}
+        while data['next'] is not None:
+            cursor = {'cursor': data['next']} if data['next'] else {}
+            _, data = self.get(name, *args, **params, **cursor)
+            results += data['results']
+        return results
+
+    def test_feeds(self):
+        """Ленты листаются курсором от новых постов к старым."""
+        expected = [post.pk for post in reversed(self.posts)]
+        for name, args, ids in (
+            ('index', (), expected),
+            ('group_list', ('api-group',), expected[1::2]),
+            ('profile', ('api_author',), expected),
+        ):
+            with self.subTest(name=name):
+                results = self.walk(name, *args, limit=2)
+                self.assertEqual([post['id'] for post in results], ids)
+
+    def test_sparse_fields(self):
+        response, data = self.get('post_detail', self.post.pk,
+                                  fields='id,author,group')
+
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(
+            data, {'id': self.post.pk, 'author': 'api_author', 'group': None})
+
+    def test_unknown_field_and_bad_cursor(self):
+        for params in ({'fields': 'id,password'}, {'cursor': 'мусор'}):
+            with self.subTest(params=params):
+                response, data = self.get('index', **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', data)
+
+    def test_malformed_cursor(self):
+        """Курсор из base64 от JSON, который не список, — ошибка 400."""
+        for name, args in (
+            ('index', ()),
+            ('post_comments', (self.post.pk,)),
+        ):
+            for cursor in ('e30', 'MQ', 'WzFd'):
+                with self.subTest(name=name, cursor=cursor):
+                    response, data = self.get(name, *args, cursor=cursor)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(data, {'error': 'Неверный курсор.'})
+
+    def test_not_found_is_json(self):
+        for name, args in (
+            ('post_detail', (10 ** 6,)),
+            ('group_list', ('no-such-group',)),
+            ('profile', ('no_such_user',)),
+        ):
+            with self.subTest(name=name):
+                response, data = self.get(name, *args)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('error', data)
+
+    def test_comments(self):
+        comments = [
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Ответ %s' % number)
+            for number in range(3)
+        ]
+
+        results = self.walk(
+            'post_comments', self.post.pk, limit=2, fields='id,text')
+
+        self.assertEqual(
+            results,
+            [{'id': comment.pk, 'text': comment.text}
+             for comment in comments],
+        )
+
+    def test_batch_keeps_order(self):
+        first, second = self.posts[0], self.posts[3]
+        ids = f'{second.pk},{10 ** 6},{first.pk}'
+
+        with self.assertNumQueries(1):
+            _, data = self.get('posts_batch', ids=ids, fields='id,text')
+
+        self.assertEqual(
+            data['results'],
+            [{'id': second.pk, 'text': second.text},
+             {'id': first.pk, 'text': first.text}],
+        )
+        self.assertEqual(data['missing'], [10 ** 6])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:index'))
+
+        self.assertEqual(response.status_code, 405)
+
+    def test_query_count_is_constant(self):
+        """Число запросов API не зависит от числа постов и комментариев."""
+        def grow(size):
+            while Post.objects.count() < size:
+                post = Post.objects.create(
+                    text='Ещё пост', author=ApiTests.author,
+                    group=ApiTests.group)
+                Comment.objects.create(
+                    post=ApiTests.post, author=ApiTests.reader, text='Ок')
+                self.ids.append(post.pk)
+
+        self.ids = []
+        cases = {
+            'index': (),
+            'posts_batch': (),
+            'post_detail': (self.post.pk,),
+            'post_comments': (self.post.pk,),
+            'group_list': ('api-group',),
+            'profile': ('api_author',),
+        }
+        self.assertEqual(
+            {pattern.name for pattern in api_urls.urlpatterns}, set(cases))
+        for name, args in cases.items():
+            with self.subTest(name=name):
+                report = constant_queries_report(
+                    lambda: self.get(
+                        name, *args, ids=','.join(map(str, self.ids))),
+                    grow, sizes=(8, 12),
+                )
+                self.assertIsNone(report, report)
@@ -0,0 +1,54 @@
+from django.test import TestCase
+
+from .. import bench
+
+
+class BenchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.data = bench.seed(
+            users=6, groups=2, posts=30, comments=40, follows=3)
+
+    def test_every_url_is_measured(self):
+        """Замер проходит по всем именованным URL, кроме меняющих данные
+           на GET, и ни один не падает."""
+        results = bench.Runner(requests=2, warmup=0).run(self.data)
+
+        names = {
+            f'{urlconf.app_name}:{pattern.name}'
+            for urlconf in bench.URLCONFS
+            for pattern in urlconf.urlpatterns
+        }
+        self.assertEqual(set(results), names - bench.SKIP)
+        for name, modes in results.items():
+            for mode, result in modes.items():
+                with self.subTest(name=name, mode=mode):
+                    self.assertLess(result['status'], 500)
+                    self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(results['posts:post_edit']['user']['status'], 200)
+        self.assertGreater(results['posts:index']['user']['bytes'], 0)
+
+    def test_compare(self):
+        old = {'posts:index': {'user': {'p50_ms': 10.0, 'queries': 9}}}
+        new = {'posts:index': {'user': {'p50_ms': 5.0, 'queries': 7}},
+               'about:tech': {'user': {'p50_ms': 1.0, 'queries': 0}}}
+
+        self.assertEqual(
+            bench.compare(old, new),
+            [('posts:index', 'user', 10.0, 5.0, 9, 7)],
+        )
+
+    def test_percentiles(self):
+        """Перцентили считаются по отсортированному списку, как в
+           sqlite_bench, и для одного замера."""
+        self.assertEqual(
+            bench.percentiles([0.001]),
+            {'p50_ms': 1.0, 'p95_ms': 1.0, 'p99_ms': 1.0},
+        )
+        values = [i / 1000 for i in range(100, 0, -1)]
+        self.assertEqual(
+            bench.percentiles(values),
+            {'p50_ms': 51.0, 'p95_ms': 96.0, 'p99_ms': 100.0},
+        )
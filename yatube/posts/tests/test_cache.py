@@ -1,8 +1,12 @@
+from unittest import mock
+
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.test import Client, SimpleTestCase, TestCase
 from django.urls import reverse
 
-from ..models import Post, User
+from .. import versions
+from ..fragments import KEY, content_version, render_articles
+from ..models import Follow, Group, Post, User
 
 
 class PostCacheTests(TestCase):
@@ -11,8 +15,10 @@ class PostCacheTests(TestCase):
         super().setUpClass()
 
         cls.author = User.objects.create_user(username='auth_user')
+        cls.follower = User.objects.create_user(username='follower_user')
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(PostCacheTests.author)
 
@@ -33,21 +39,51 @@ class PostCacheTests(TestCase):
     def test_index_page_with_cache(self):
         """Проверка отображения главной страницы
            с использованием кеша."""
-        post = Post.objects.create(
+        Post.objects.create(
             text='Пост для проверки кеша',
             author=PostCacheTests.author,
         )
         reverse_name = self.get_revers_name('index')
 
-        response_with_one_post = self.authorized_client.get(reverse_name)
-        post.delete()
-        response_after_del_post = self.authorized_client.get(reverse_name)
+        response_before_update = self.authorized_client.get(reverse_name)
+        # update() не вызывает сигналов, версия кеша не меняется.
+        Post.objects.update(text='Текст, которого нет в кеше')
+        response_after_update = self.authorized_client.get(reverse_name)
 
         self.assertEqual(
-            response_with_one_post.content,
-            response_after_del_post.content
+            response_before_update.content,
+            response_after_update.content
         )
 
+    def test_pages_cache_invalidated_on_delete(self):
+        """Удалённый пост сразу пропадает из кешированных лент."""
+        group = Group.objects.create(
+            title='Группа', slug='cache-group', description='Описание')
+        post = Post.objects.create(
+            text='Пост для проверки кеша',
+            author=PostCacheTests.author,
+            group=group,
+        )
+        Follow.objects.create(
+            user=PostCacheTests.follower, author=PostCacheTests.author)
+        follower_client = Client()
+        follower_client.force_login(PostCacheTests.follower)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={
+                'username': PostCacheTests.author.username}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assertContains(follower_client.get(url), post.text)
+
+        post.delete()
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(follower_client.get(url), post.text)
+
     def test_index_page_without_cache(self):
         """Проверка отображения главной страницы
            без использования кеша."""
@@ -66,3 +102,44 @@ class PostCacheTests(TestCase):
             response_with_one_post.content,
             response_after_del_post.content
         )
+
+    def test_article_fragment_shared_between_feeds(self):
+        """Карточка поста, отрендеренная для одной ленты,
+           берётся из кеша в другой и обновляется после правки."""
+        group = Group.objects.create(
+            title='Группа', slug='fragment-group', description='Описание')
+        post = Post.objects.create(
+            text='Пост для проверки карточки',
+            author=PostCacheTests.author,
+            group=group,
+        )
+        render_articles([post])
+        cache.set(KEY.format(post.pk, content_version(post)), 'из кеша')
+        group_url = reverse('posts:group_list', kwargs={'slug': group.slug})
+
+        self.assertContains(self.authorized_client.get(group_url), 'из кеша')
+
+        post.text = 'Новый текст поста'
+        post.save()
+
+        response = self.authorized_client.get(group_url)
+        self.assertNotContains(response, 'из кеша')
+        self.assertContains(response, post.text)
+
+
+class VersionsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_gives_unique_versions_without_incr(self):
+        """Версия меняется без cache.incr, который у файлового кеша
+           не атомарен, и не повторяется."""
+        seen = {versions.current('scope')}
+        with mock.patch.object(cache, 'incr', side_effect=AssertionError):
+            for _ in range(5):
+                versions.bump('scope', 'other')
+                seen.add(versions.current('scope'))
+
+        self.assertEqual(len(seen), 6)
+        self.assertNotEqual(versions.current('scope'),
+                            versions.current('other'))
@@ -0,0 +1,110 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='etag-group',
+            description='Группа для проверки ETag',
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTests.reader)
+
+    def urls(self):
+        return {
+            'index': reverse('posts:index'),
+            'group_list': reverse('posts:group_list', args=['etag-group']),
+            'profile': reverse('posts:profile', args=['etag_author']),
+            'post_detail': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+
+    def revalidate(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_are_not_modified(self):
+        """Повторный запрос с ETag получает 304 без рендера шаблона."""
+        for name, url in self.urls().items():
+            for client in (self.guest_client, self.reader_client):
+                with self.subTest(name=name, client=client):
+                    response = self.revalidate(client, url)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertIsNone(response.context)
+                    self.assertIn('Cookie', response['Vary'])
+
+    def test_if_modified_since_for_guests(self):
+        url = self.urls()['index']
+        response = self.guest_client.get(url)
+
+        self.assertEqual(
+            self.guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code,
+            304,
+        )
+        # У вошедшего пользователя страница зависит от сессии.
+        self.assertFalse(self.reader_client.get(url).has_header(
+            'Last-Modified'))
+
+    def test_changes_invalidate_validator(self):
+        """Изменения, видимые на странице, меняют ETag."""
+        urls = self.urls()
+        changes = {
+            'index': lambda: Post.objects.create(
+                text='Новый', author=self.reader),
+            'group_list': lambda: Group.objects.filter(
+                pk=self.group.pk).first().save(),
+            'profile': lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+            'post_detail': lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+        }
+        for name, change in changes.items():
+            with self.subTest(name=name):
+                etag = self.reader_client.get(urls[name])['ETag']
+                change()
+                response = self.reader_client.get(
+                    urls[name], HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_edit_invalidates_post_page(self):
+        url = self.urls()['post_detail']
+        etag = self.guest_client.get(url)['ETag']
+
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_validator_differs_between_users(self):
+        url = self.urls()['index']
+        guest_etag = self.guest_client.get(url)['ETag']
+
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=guest_etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_missing_objects_still_404(self):
+        for url in (
+            reverse('posts:group_list', args=['no-such-group']),
+            reverse('posts:post_detail', args=[10 ** 6]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.guest_client.get(url).status_code, 404)
@@ -0,0 +1,130 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='counter_author')
+        cls.group = Group.objects.create(
+            title='Группа 1',
+            slug='counter-group-1',
+            description='Первая группа'
+        )
+        cls.group_second = Group.objects.create(
+            title='Группа 2',
+            slug='counter-group-2',
+            description='Вторая группа'
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(CountersTests.author)
+
+    def assertCounters(self, user_posts, user_comments, groups):
+        stats = UserStats.objects.get(user=CountersTests.author)
+        self.assertEqual(stats.posts_count, user_posts)
+        self.assertEqual(stats.comments_count, user_comments)
+        for group, (posts, comments) in groups.items():
+            group.refresh_from_db()
+            self.assertEqual(group.posts_count, posts)
+            self.assertEqual(group.comments_count, comments)
+
+    def test_counters_follow_posts_and_comments(self):
+        """Счётчики меняются при создании, переносе и удалении."""
+        post = Post.objects.create(
+            text='Пост',
+            author=CountersTests.author,
+            group=CountersTests.group,
+        )
+        Comment.objects.create(
+            post=post, author=CountersTests.author, text='Комментарий')
+        self.assertCounters(1, 1, {
+            CountersTests.group: (1, 1),
+            CountersTests.group_second: (0, 0),
+        })
+
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Пост', 'group': CountersTests.group_second.pk},
+        )
+        self.assertCounters(1, 1, {
+            CountersTests.group: (0, 0),
+            CountersTests.group_second: (1, 1),
+        })
+
+        post.refresh_from_db()
+        post.delete()
+        self.assertCounters(0, 0, {
+            CountersTests.group: (0, 0),
+            CountersTests.group_second: (0, 0),
+        })
+
+    def test_recount_repairs_drift(self):
+        """Команда recount_counters исправляет расхождения."""
+        post = Post.objects.create(
+            text='Пост',
+            author=CountersTests.author,
+            group=CountersTests.group,
+        )
+        Comment.objects.create(
+            post=post, author=CountersTests.author, text='Комментарий')
+        UserStats.objects.update(posts_count=42, comments_count=0)
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=0)
+
+        call_command('recount_counters', batch_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertCounters(1, 1, {
+            CountersTests.group: (1, 1),
+            CountersTests.group_second: (0, 0),
+        })
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sum('COUNT(' in q['sql'] for q in queries.captured_queries)
+
+    def test_pages_use_counters(self):
+        """Страница поста, профиль и группа не считают посты: число
+           берётся из счётчиков, в том числе для пагинатора."""
+        post = Post.objects.create(text='Пост', author=CountersTests.author,
+                                   group=CountersTests.group)
+
+        self.assertEqual(self.count_queries(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})), 0)
+        self.assertEqual(self.count_queries(
+            reverse('posts:profile', kwargs={
+                'username': CountersTests.author.username})), 0)
+        self.assertEqual(self.count_queries(
+            reverse('posts:group_list', kwargs={
+                'slug': CountersTests.group.slug})), 0)
+
+    def test_paginator_uses_stored_count(self):
+        Post.objects.bulk_create([
+            Post(text=f'Пост {number}', author=CountersTests.author,
+                 group=CountersTests.group)
+            for number in range(settings.POSTS_COUNT + 1)
+        ])
+        Group.objects.filter(pk=CountersTests.group.pk).update(
+            posts_count=settings.POSTS_COUNT + 1)
+        url = reverse('posts:group_list',
+                      kwargs={'slug': CountersTests.group.slug})
+
+        response = self.authorized_client.get(url, {'page': 2})
+
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+        self.assertEqual(len(response.context['page_obj']), 1)
@@ -0,0 +1,134 @@
+import csv
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='export_author')
+        cls.reader = User.objects.create_user(username='export_reader')
+        cls.group = Group.objects.create(
+            title='Группа для выгрузки',
+            slug='export-group',
+            description='Группа',
+        )
+        cls.first = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group)
+        cls.second = Post.objects.create(
+            text='Второй пост', author=cls.author, image='posts/cat.gif')
+        cls.comment = Comment.objects.create(
+            post=cls.first, author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ExportTests.reader)
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_profile_export_ndjson(self):
+        """Выгрузка автора: посты от новых к старым, комментарии
+           сразу после своего поста."""
+        response, content = self.export(
+            reverse('posts:profile_export', args=['export_author']),
+            comments='1',
+        )
+
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(record['type'], record['id']) for record in records],
+            [
+                ('post', self.second.pk),
+                ('post', self.first.pk),
+                ('comment', self.comment.pk),
+            ],
+        )
+        self.assertEqual(records[1]['group'], 'export-group')
+        self.assertEqual(records[2]['author'], 'export_reader')
+        self.assertNotIn('image_url', records[0])
+
+    def test_group_export_csv_with_images(self):
+        response, content = self.export(
+            reverse('posts:group_export', args=['export-group']),
+            format='csv', images='1',
+        )
+
+        self.assertIn(
+            'group-export-group.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([row['id'] for row in rows], [str(self.first.pk)])
+        self.assertEqual(rows[0]['image_url'], '')
+
+    def test_image_urls_are_absolute(self):
+        _, content = self.export(
+            reverse('posts:profile_export', args=['export_author']),
+            images='1',
+        )
+
+        record = json.loads(content.splitlines()[0])
+        self.assertEqual(record['image'], 'posts/cat.gif')
+        self.assertEqual(
+            record['image_url'], 'http://testserver/media/posts/cat.gif')
+
+    def test_flags_can_be_turned_off(self):
+        """?comments=0 и ?images=false выключают комментарии и ссылки
+           на картинки, а не включают их."""
+        _, content = self.export(
+            reverse('posts:profile_export', args=['export_author']),
+            comments='0', images='false',
+        )
+
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [record['type'] for record in records], ['post', 'post'])
+        self.assertNotIn('image_url', records[0])
+
+    def test_export_requires_login(self):
+        response = Client().get(
+            reverse('posts:profile_export', args=['export_author']))
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command(
+            'export_posts', '--group=export-group', '--comments', stdout=out)
+
+        self.assertEqual(
+            [json.loads(line)['type'] for line in out.getvalue().splitlines()],
+            ['post', 'comment'],
+        )
+        with self.assertRaises(CommandError):
+            call_command(
+                'export_posts', '--author=nobody', stdout=StringIO())
+
+    def test_export_can_be_imported(self):
+        """Выгрузку можно загрузить обратно через import_data."""
+        _, content = self.export(
+            reverse('posts:profile_export', args=['export_author']),
+            comments='1',
+        )
+        Post.objects.all().delete()
+
+        with mock.patch('sys.stdin', StringIO(content)):
+            call_command(
+                'import_data', '-', source='export', skip_rebuild=True,
+                stdout=StringIO())
+
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.get().text, 'Комментарий')
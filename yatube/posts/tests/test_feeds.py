@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(
+            username='feed_author', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Группа с лентой',
+            slug='feed-group',
+            description='Описание группы',
+        )
+        cls.post = Post.objects.create(
+            text='Пост в ленте', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds(self):
+        for name, args, content_type, expected in (
+            ('index_rss', (), 'application/rss+xml', 'Пост в ленте'),
+            ('index_atom', (), 'application/atom+xml', 'Пост в ленте'),
+            ('group_rss', ('feed-group',), 'application/rss+xml',
+             'Группа с лентой'),
+            ('group_atom', ('feed-group',), 'application/atom+xml',
+             'Описание группы'),
+            ('profile_rss', ('feed_author',), 'application/rss+xml',
+             'Лев Толстой'),
+            ('profile_atom', ('feed_author',), 'application/atom+xml',
+             'Лев Толстой'),
+        ):
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse('posts:' + name, args=args))
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type))
+                self.assertContains(response, expected)
+                self.assertContains(
+                    response,
+                    reverse('posts:post_detail', args=[self.post.pk]),
+                )
+
+    def test_feed_is_cached_until_new_post(self):
+        url = reverse('posts:group_rss', args=['feed-group'])
+        self.client.get(url)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(url)
+        self.assertContains(cached, 'Пост в ленте')
+
+        Post.objects.create(
+            text='Свежий пост', author=self.author, group=self.group)
+        self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_polling_reader_gets_not_modified(self):
+        url = reverse('posts:profile_atom', args=['feed_author'])
+        response = self.client.get(url)
+
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.client.get(url, **headers).status_code, 304)
+
+    def test_unknown_group_or_author(self):
+        for url in (
+            reverse('posts:group_rss', args=['no-such-group']),
+            reverse('posts:profile_atom', args=['no_such_user']),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_pages_link_to_feeds(self):
+        response = self.client.get(
+            reverse('posts:group_list', args=['feed-group']))
+
+        self.assertContains(
+            response, reverse('posts:group_rss', args=['feed-group']))
@@ -1,7 +1,15 @@
-from django.test import Client, TestCase
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Post, User
+from ..models import Follow, Post, TimelineEntry, User, UserStats
+from ..timeline import HybridFeed, follow_feed
+from ..utils import CursorPaginator
 
 
 class FollowTests(TestCase):
@@ -83,3 +91,290 @@ class FollowTests(TestCase):
         posts_count_from_context = len(response.context['page_obj'])
 
         self.assertEqual(posts_count_from_context, 0)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика."""
+        Follow.objects.create(
+            user=FollowTests.follower_user,
+            author=FollowTests.author,
+        )
+        new_post = Post.objects.create(
+            text='Свежий пост',
+            author=FollowTests.author,
+        )
+
+        entries = TimelineEntry.objects.filter(user=FollowTests.follower_user)
+
+        self.assertEqual(
+            set(entries.values_list('post_id', flat=True)),
+            {FollowTests.post.pk, new_post.pk}
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=FollowTests.other_user).exists()
+        )
+
+    def test_timeline_feed_uses_cursor_pagination(self):
+        """Лента без популярных авторов тоже листается по курсору:
+           без COUNT и OFFSET, по ключу материализованной ленты."""
+        author = FollowTests.author
+        Follow.objects.create(user=FollowTests.follower_user, author=author)
+        pub_date = FollowTests.post.pub_date
+        posts = [FollowTests.post] + [
+            Post.objects.create(text='Пост %s' % i, author=author)
+            for i in range(11)
+        ]
+        # одинаковые даты различает id поста
+        Post.objects.filter(author=author).update(pub_date=pub_date)
+        TimelineEntry.objects.update(pub_date=pub_date)
+
+        url = reverse('posts:follow_index')
+        received = []
+        params = {}
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.follower_client.get(url, params)
+            page_obj = response.context['page_obj']
+            self.assertIsInstance(page_obj.paginator, CursorPaginator)
+            self.assertFalse(any(
+                'COUNT(' in query['sql'] or 'OFFSET' in query['sql']
+                for query in queries.captured_queries))
+            received += list(page_obj)
+            if not page_obj.has_next():
+                break
+            params = {'page': page_obj.next_page_number()}
+
+        self.assertEqual(received, posts[::-1])
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки посты автора исчезают из ленты."""
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={
+                'username': FollowTests.author}))
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', kwargs={
+                'username': FollowTests.author}))
+
+        response = self.follower_client.get(reverse('posts:follow_index'))
+
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        """Повторные подписка и отписка ничего не меняют и не падают."""
+        follow_url = reverse('posts:profile_follow', kwargs={
+            'username': FollowTests.author})
+        unfollow_url = reverse('posts:profile_unfollow', kwargs={
+            'username': FollowTests.author})
+        stats = UserStats.objects.filter(user=FollowTests.author)
+
+        for _ in range(2):
+            self.follower_client.get(follow_url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(stats.get().followers_count, 1)
+
+        for _ in range(2):
+            response = self.follower_client.get(unfollow_url)
+            self.assertRedirects(response, reverse(
+                'posts:profile', kwargs={'username': FollowTests.author}))
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(stats.get().followers_count, 0)
+
+    def test_cannot_follow_self(self):
+        self.follower_client.get(reverse('posts:profile_follow', kwargs={
+            'username': FollowTests.follower_user}))
+
+        self.assertFalse(Follow.objects.exists())
+
+    def test_manager_returns_changed_follows(self):
+        user = FollowTests.follower_user
+        authors = [FollowTests.author, FollowTests.other_user.pk, user]
+
+        created = Follow.objects.follow(user, authors)
+
+        self.assertEqual(
+            sorted(follow.author_id for follow in created),
+            sorted([FollowTests.author.pk, FollowTests.other_user.pk]))
+        self.assertEqual(Follow.objects.follow(user, authors), [])
+        # сигналы разложили посты автора в ленту
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=user, post=FollowTests.post).exists())
+
+        removed = Follow.objects.unfollow(user, [FollowTests.author])
+
+        self.assertEqual([follow.author_id for follow in removed],
+                         [FollowTests.author.pk])
+        self.assertEqual(Follow.objects.unfollow(user, authors[:1]), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=user).exists())
+
+    def test_manager_without_returning(self):
+        """На SQLite старше 3.35 менеджер обходится без RETURNING."""
+        with mock.patch('posts.models.HAS_RETURNING', False):
+            self.test_manager_returns_changed_follows()
+
+        self.assertEqual(
+            UserStats.objects.get(user=FollowTests.author).followers_count,
+            0)
+        self.assertEqual(
+            UserStats.objects.get(
+                user=FollowTests.other_user).followers_count,
+            1)
+
+    def test_follow_many(self):
+        """Подписки и отписки пачкой одним POST."""
+        Follow.objects.create(
+            user=FollowTests.follower_user, author=FollowTests.other_user)
+        url = reverse('posts:follow_many')
+
+        response = self.follower_client.post(url, {
+            'follow': [FollowTests.author.username, 'nobody'],
+            'unfollow': [FollowTests.other_user.username],
+        })
+
+        self.assertRedirects(response, reverse('posts:follow_index'))
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(FollowTests.follower_user.pk, FollowTests.author.pk)])
+        self.assertEqual(self.follower_client.get(url).status_code, 405)
+        self.assertEqual(self.follower_client.post(url, {
+            'follow': ['x'] * 101}).status_code, 400)
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2, POSTS_COUNT=2)
+class HybridFeedTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other_reader')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        cls.author = User.objects.create_user(username='regular_author')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(HybridFeedTests.reader)
+
+    def test_celebrity_posts_are_pulled_and_merged(self):
+        """Посты популярного автора не раскладываются по лентам,
+           но подмешиваются в ленту подписок в порядке публикации.
+        """
+        reader = HybridFeedTests.reader
+        celebrity = HybridFeedTests.celebrity
+        author = HybridFeedTests.author
+        old_post = Post.objects.create(text='Ранний пост', author=celebrity)
+        Follow.objects.create(user=reader, author=celebrity)
+        Follow.objects.create(
+            user=HybridFeedTests.other_reader, author=celebrity)
+        Follow.objects.create(user=reader, author=author)
+
+        posts = [
+            Post.objects.create(text='Пост %s' % i, author=post_author)
+            for i, post_author in enumerate((author, celebrity, author))
+        ]
+
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author=celebrity).exclude(post=old_post).exists())
+
+        expected = posts[::-1] + [old_post]
+        received = []
+        url = reverse('posts:follow_index')
+        params = {}
+        while True:
+            page_obj = self.reader_client.get(url, params).context['page_obj']
+            self.assertIsInstance(page_obj.paginator, CursorPaginator)
+            received += list(page_obj)
+            if not page_obj.has_next():
+                break
+            params = {'page': page_obj.next_page_number()}
+
+        self.assertEqual(received, expected)
+
+    def read_feed(self, backwards=False):
+        """Все посты ленты по курсорам: от первой страницы вперёд или
+           от последней назад."""
+        url = reverse('posts:follow_index')
+        params = {}
+        if backwards:
+            page_obj = self.reader_client.get(url).context['page_obj']
+            params = {'page': page_obj.paginator.num_pages}
+        received = []
+        while True:
+            page_obj = self.reader_client.get(url, params).context['page_obj']
+            if backwards:
+                received = list(page_obj) + received
+                if not page_obj.has_previous():
+                    return received
+                params = {'page': page_obj.previous_page_number()}
+            else:
+                received += list(page_obj)
+                if not page_obj.has_next():
+                    return received
+                params = {'page': page_obj.next_page_number()}
+
+    def test_cursor_survives_switch_to_hybrid_feed(self):
+        """Лента с популярным автором и без него листается одним
+           режимом: курсор и ключ фрагмента страницы не меняются,
+           когда автор становится популярным."""
+        reader = HybridFeedTests.reader
+        author = HybridFeedTests.author
+        Follow.objects.create(user=reader, author=author)
+        posts = [
+            Post.objects.create(text='Пост %s' % i, author=author)
+            for i in range(5)
+        ]
+        url = reverse('posts:follow_index')
+        cursor = self.reader_client.get(url).context[
+            'page_obj'].next_page_number()
+
+        page_obj = self.reader_client.get(url, {'page': cursor}).context[
+            'page_obj']
+        self.assertEqual(list(page_obj), posts[2:0:-1])
+        number = page_obj.number
+        Follow.objects.create(
+            user=HybridFeedTests.other_reader, author=author)
+        self.assertIsInstance(follow_feed(reader), HybridFeed)
+        page_obj = self.reader_client.get(url, {'page': cursor}).context[
+            'page_obj']
+
+        self.assertEqual(list(page_obj), posts[2:0:-1])
+        self.assertEqual(page_obj.number, number)
+
+    @override_settings(FEED_CELEBRITY_POSTS=2)
+    def test_celebrity_posts_beyond_cached_list(self):
+        """Глубже кешированного списка посты популярного автора
+           читаются из базы и не пропадают из ленты."""
+        celebrity = HybridFeedTests.celebrity
+        author = HybridFeedTests.author
+        Follow.objects.create(user=HybridFeedTests.reader, author=celebrity)
+        Follow.objects.create(
+            user=HybridFeedTests.other_reader, author=celebrity)
+        Follow.objects.create(user=HybridFeedTests.reader, author=author)
+        posts = [
+            Post.objects.create(text='Пост %s' % i, author=post_author)
+            for i, post_author in enumerate([celebrity] * 4 + [author])
+        ]
+
+        self.assertEqual(self.read_feed(), posts[::-1])
+        self.assertEqual(self.read_feed(backwards=True), posts[::-1])
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+class CelebrityDemotionTests(TransactionTestCase):
+    def test_unfollow_below_threshold_fills_timelines(self):
+        """Автор, ставший обычным, раскладывается по лентам."""
+        cache.clear()
+        reader = User.objects.create_user(username='reader')
+        other_reader = User.objects.create_user(username='other_reader')
+        celebrity = User.objects.create_user(username='celebrity')
+        Follow.objects.create(user=reader, author=celebrity)
+        Follow.objects.create(user=other_reader, author=celebrity)
+        post = Post.objects.create(text='Пост', author=celebrity)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+        Follow.objects.filter(user=other_reader).delete()
+
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(reader.pk, post.pk)])
@@ -0,0 +1,156 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph
+from ..follow_graph import FollowGraph, graph
+from ..models import Follow, FollowChange, User
+
+
+class FollowGraphTests(TransactionTestCase):
+    """Граф работает вне транзакций, поэтому тесты без TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username=f'graph_{number}')
+            for number in range(4)
+        ]
+        self.reader, self.author, self.other, self.lonely = self.users
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        # База тестов очищается между ними, журнал — тоже.
+        graph.load()
+
+    def test_answers_without_queries(self):
+        graph.follows(self.reader.pk, self.author.pk)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.follows(self.reader.pk, self.author.pk))
+            self.assertFalse(graph.follows(self.author.pk, self.reader.pk))
+            self.assertEqual(graph.followers_count(self.author.pk), 2)
+            self.assertEqual(graph.followers_count(self.lonely.pk), 0)
+            self.assertEqual(graph.following_count(self.reader.pk), 2)
+            self.assertEqual(graph.following(self.reader.pk),
+                             sorted([self.author.pk, self.other.pk]))
+            self.assertEqual(graph.following(10 ** 6), [])
+
+    def test_follow_signals_keep_graph_fresh(self):
+        """Свои подписки и отписки применяются без перезагрузки."""
+        graph.follows(self.reader.pk, self.author.pk)
+        Follow.objects.follow(self.lonely, [self.author, self.reader])
+        Follow.objects.unfollow(self.reader, [self.author])
+        Follow.objects.get(user=self.reader, author=self.other).delete()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.follows(self.lonely.pk, self.author.pk))
+            self.assertFalse(graph.follows(self.reader.pk, self.author.pk))
+            self.assertEqual(graph.followers_count(self.author.pk), 2)
+            self.assertEqual(graph.followers_count(self.reader.pk), 1)
+            self.assertEqual(graph.following(self.reader.pk), [])
+            self.assertEqual(graph.following_count(self.lonely.pk), 2)
+
+    def test_applies_changes_from_other_processes(self):
+        """Подписка другого процесса дочитывается из журнала одним
+           запросом, без перезагрузки графа."""
+        other = FollowGraph()
+        other.load()
+
+        Follow.objects.follow(self.lonely, [self.other])
+
+        with self.assertNumQueries(1):
+            self.assertTrue(other.follows(self.lonely.pk, self.other.pk))
+            self.assertEqual(other.followers_count(self.other.pk), 2)
+        with mock.patch.object(FollowGraph, '_start_loading') as load:
+            Follow.objects.unfollow(self.lonely, [self.other])
+            self.assertFalse(other.follows(self.lonely.pk, self.other.pk))
+        load.assert_not_called()
+
+    def test_interleaved_versions(self):
+        """Процесс, записавший версию последним, видит и чужую
+           подписку, закоммиченную после его собственной."""
+        first, second = FollowGraph(), FollowGraph()
+        first.load()
+        second.load()
+        versions = iter(['v1', 'v2'])
+
+        with mock.patch.object(follow_graph, 'graph'), \
+                mock.patch.object(follow_graph, '_new_version',
+                                  side_effect=lambda: next(versions)):
+            # Коммиты в порядке first, second, а версии — наоборот:
+            # second сообщает о себе раньше, first — последним.
+            Follow.objects.follow(self.lonely, [self.author])
+            Follow.objects.follow(self.author, [self.other])
+            second.changed()
+            first.changed()
+
+        self.assertEqual(cache.get(follow_graph.VERSION_KEY), 'v2')
+        for process in (first, second):
+            with self.subTest(process=process):
+                self.assertTrue(
+                    process.follows(self.lonely.pk, self.author.pk))
+                self.assertTrue(
+                    process.follows(self.author.pk, self.other.pk))
+
+    def test_loads_in_background(self):
+        """Пока граф загружается, ответы берутся из БД."""
+        other = FollowGraph()
+
+        self.assertTrue(other.follows(self.reader.pk, self.author.pk))
+        other._loader.join()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(other.follows(self.reader.pk, self.author.pk))
+            self.assertEqual(other.followers_count(self.author.pk), 2)
+
+    def test_reloads_when_log_was_pruned(self):
+        """Без нужных записей журнала граф загружается заново в фоне,
+           а до конца загрузки отвечает прежний."""
+        other = FollowGraph()
+        other.load()
+        Follow.objects.follow(self.lonely, [self.other])
+        FollowChange.objects.all().delete()
+        Follow.objects.follow(self.lonely, [self.reader])
+
+        with mock.patch.object(FollowGraph, '_start_loading') as load:
+            self.assertFalse(other.follows(self.lonely.pk, self.other.pk))
+        load.assert_called_once()
+
+        other.follows(self.lonely.pk, self.other.pk)
+        other._loader.join()
+        self.assertTrue(other.follows(self.lonely.pk, self.other.pk))
+        self.assertTrue(other.follows(self.lonely.pk, self.reader.pk))
+
+    def test_rolled_back_follow_is_ignored(self):
+        graph.follows(self.lonely.pk, self.author.pk)
+
+        with transaction.atomic():
+            Follow.objects.follow(self.lonely, [self.author])
+            # внутри транзакции ответ из БД, со своей записью
+            self.assertTrue(graph.follows(self.lonely.pk, self.author.pk))
+            transaction.set_rollback(True)
+
+        self.assertFalse(graph.follows(self.lonely.pk, self.author.pk))
+        self.assertEqual(graph.followers_count(self.author.pk), 2)
+
+    def test_profile_uses_graph(self):
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if Follow._meta.db_table in query['sql']
+        ])
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['followers_count'], 2)
+        self.assertEqual(response.context['following_count'], 0)
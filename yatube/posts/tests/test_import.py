@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import versions
+from ..models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                      TimelineEntry, User, UserStats)
+from ..search import SearchResults
+
+RECORDS = [
+    {'type': 'user', 'username': 'leo', 'first_name': 'Лев'},
+    {'type': 'user', 'username': 'reader'},
+    {'type': 'group', 'slug': 'cats', 'title': 'Котики'},
+    {'type': 'post', 'id': 100, 'author': 'leo', 'group': 'cats',
+     'text': 'Архивный пост про котиков',
+     'pub_date': '2019-05-01T10:00:00+00:00'},
+    {'type': 'post', 'id': 101, 'author': 'leo', 'text': 'Второй пост'},
+    {'type': 'comment', 'post': 100, 'author': 'reader',
+     'text': 'Комментарий', 'created': '2019-05-02T10:00:00+00:00'},
+    {'type': 'follow', 'user': 'reader', 'author': 'leo'},
+]
+
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def write_ndjson(self, records):
+        return self.write('data.ndjson', ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records
+        ))
+
+    def call(self, path, **options):
+        out = StringIO()
+        call_command('import_data', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """Загрузка сохраняет даты и пересчитывает производные данные."""
+        out = self.call(self.write_ndjson(RECORDS), batch_size=2)
+
+        self.assertIn('в секунду', out)
+        leo = User.objects.get(username='leo')
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.author, leo)
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(
+            post.pub_date, timezone.make_aware(datetime(2019, 5, 1, 10)))
+        comment = Comment.objects.get()
+        self.assertEqual(
+            comment.created, timezone.make_aware(datetime(2019, 5, 2, 10)))
+        self.assertFalse(leo.has_usable_password())
+        # то, что обычно делают сигналы
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(leo.stats.posts_count, 2)
+        self.assertEqual(leo.stats.followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user__username='reader').count(), 2)
+        self.assertEqual(
+            [found.pk for found in SearchResults('котиков').keyset(
+                None, False, 10)],
+            [100],
+        )
+
+    def test_import_resumes_after_failure(self):
+        """После ошибки загрузка продолжается без повторов."""
+        broken = RECORDS[:5] + [
+            {'type': 'comment', 'post': 100, 'author': 'nobody', 'text': '?'},
+        ] + RECORDS[6:]
+        path = self.write_ndjson(broken)
+
+        with self.assertRaises(CommandError):
+            self.call(path, chunk_size=2)
+
+        # Порция с ошибкой (записи 5 и 6) откатилась целиком.
+        self.assertEqual(ImportCheckpoint.objects.get().position, 4)
+        self.assertEqual(Post.objects.count(), 1)
+        # Повторный запуск пропустит пост 100, поэтому он уже пересчитан.
+        self.assertEqual(
+            User.objects.get(username='leo').stats.posts_count, 1)
+        self.assertEqual(
+            [found.pk for found in SearchResults('котиков').keyset(
+                None, False, 10)],
+            [100],
+        )
+
+        self.write_ndjson(RECORDS)
+        out = self.call(path, chunk_size=2)
+
+        self.assertIn('Пропущено загруженных ранее: 4', out)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertIn('Новых записей нет', self.call(path))
+
+    def test_rebuild_is_limited_to_imported_data(self):
+        """Пересчитываются только затронутые загрузкой данные, кеш
+        не очищается, а сбрасываются версии их областей."""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Чужой пост')
+        # расхождение, которое исправил бы только полный пересчёт
+        UserStats.objects.filter(user=other).update(posts_count=5)
+        cache.set('unrelated', 1)
+        before = versions.current('posts', f'author:{other.pk}')
+
+        self.call(self.write_ndjson(RECORDS))
+
+        self.assertEqual(UserStats.objects.get(user=other).posts_count, 5)
+        self.assertEqual(
+            User.objects.get(username='leo').stats.posts_count, 2)
+        self.assertEqual(cache.get('unrelated'), 1)
+        after = versions.current('posts', f'author:{other.pk}')
+        self.assertNotEqual(after.split('.')[0], before.split('.')[0])
+        self.assertEqual(after.split('.')[1], before.split('.')[1])
+
+    def test_nothing_loaded_skips_rebuild(self):
+        path = self.write_ndjson(RECORDS)
+        self.call(path, skip_rebuild=True)
+
+        with mock.patch('posts.importer.counters.recount') as recount:
+            out = self.call(path)
+
+        self.assertIn('Новых записей нет', out)
+        recount.assert_not_called()
+
+    def test_taken_post_id_stops_import(self):
+        """Пост с занятым id не пропускается: иначе его комментарии
+           достались бы чужому посту."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(pk=100, author=author, text='Свой пост')
+
+        with self.assertRaisesMessage(CommandError, 'пост 100 уже есть'):
+            self.call(self.write_ndjson(RECORDS))
+
+        self.assertEqual(Post.objects.get(pk=100).text, 'Свой пост')
+        self.assertFalse(Comment.objects.exists())
+
+    def test_repeated_post_id_stops_import(self):
+        records = RECORDS[:5] + [dict(RECORDS[4], text='Повтор')]
+
+        with self.assertRaisesMessage(CommandError, 'уже есть в архиве'):
+            self.call(self.write_ndjson(records))
+
+        self.assertFalse(Post.objects.exists())
+
+    def test_import_csv_of_one_type(self):
+        User.objects.create_user(username='leo')
+        path = self.write(
+            'posts.csv',
+            'author,text,group,pub_date\n'
+            'leo,Пост из CSV,,2020-01-01T00:00:00\n'
+        )
+
+        self.call(path, type='post', skip_rebuild=True)
+
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Пост из CSV')
+        self.assertIsNone(post.group)
+        self.assertEqual(post.pub_date.year, 2020)
@@ -0,0 +1,41 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class FollowMigrationTests(TransactionTestCase):
+    before = [('posts', '0002_follow')]
+    after = [('posts', '0003_counters')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_follows_are_removed_before_constraint(self):
+        """Миграция с unique_follows проходит на базе с повторяющимися
+           подписками и оставляет по одной."""
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('posts', 'Follow')
+        reader = User.objects.create(username='reader')
+        author = User.objects.create(username='author')
+        other = User.objects.create(username='other')
+        first = Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=reader, author=author)
+        kept = Follow.objects.create(user=reader, author=other)
+
+        apps = self.migrate(self.after)
+
+        Follow = apps.get_model('posts', 'Follow')
+        self.assertEqual(
+            sorted(Follow.objects.values_list('pk', flat=True)),
+            [first.pk, kept.pk],
+        )
+        stats = apps.get_model('posts', 'UserStats')
+        self.assertEqual(stats.objects.count(), 3)
@@ -0,0 +1,129 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import constant_queries_report
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post, User
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов на каждый URL из posts/urls.py не зависит
+       от количества постов и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='budget_author')
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='budget-group',
+            description='Группа для проверки числа запросов'
+        )
+        cls.post = Post.objects.create(
+            text='Пост с комментариями',
+            author=cls.author,
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(QueryBudgetTests.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(QueryBudgetTests.reader)
+
+    def grow_posts(self, size):
+        while Post.objects.count() < size:
+            Post.objects.create(
+                text='Пост',
+                author=QueryBudgetTests.author,
+                group=QueryBudgetTests.group,
+            )
+
+    def grow_posts_following(self, size):
+        self.grow_posts(size)
+        Follow.objects.get_or_create(
+            user=QueryBudgetTests.reader, author=QueryBudgetTests.author)
+
+    def grow_comments(self, size):
+        post = QueryBudgetTests.post
+        while post.comments.count() < size:
+            commenter = User.objects.create_user(
+                username='commenter_%s' % post.comments.count())
+            Comment.objects.create(post=post, author=commenter, text='Ок')
+
+    def grow_groups(self, size):
+        while Group.objects.count() < size:
+            number = Group.objects.count()
+            Group.objects.create(
+                title='Группа %s' % number,
+                slug='budget-group-%s' % number,
+                description='Ещё одна группа',
+            )
+
+    def get_cases(self):
+        post_kwargs = {'post_id': QueryBudgetTests.post.pk}
+        user_kwargs = {'username': QueryBudgetTests.author.username}
+        reader = self.reader_client
+        return {
+            'index': ('get', {}, reader, self.grow_posts),
+            'group_list': (
+                'get', {'slug': QueryBudgetTests.group.slug},
+                reader, self.grow_posts),
+            'profile': ('get', user_kwargs, reader, self.grow_posts),
+            'post_detail': ('get', post_kwargs, reader, self.grow_comments),
+            'post_create': ('get', {}, reader, self.grow_groups),
+            'post_edit': (
+                'get', post_kwargs, self.author_client, self.grow_groups),
+            'add_comment': ('post', post_kwargs, reader, self.grow_comments),
+            'follow_index': ('get', {}, reader, self.grow_posts),
+            'profile_follow': ('get', user_kwargs, reader, self.grow_posts),
+            'profile_unfollow': (
+                'get', user_kwargs, reader, self.grow_posts_following),
+            'follow_many': ('post', {}, reader, self.grow_posts_following),
+            'search': ('get', {}, reader, self.grow_posts),
+            'profile_export': ('get', user_kwargs, reader, self.grow_posts),
+            'group_export': (
+                'get', {'slug': QueryBudgetTests.group.slug},
+                reader, self.grow_posts),
+            'index_rss': ('get', {}, reader, self.grow_posts),
+            'index_atom': ('get', {}, reader, self.grow_posts),
+            'group_rss': (
+                'get', {'slug': QueryBudgetTests.group.slug},
+                reader, self.grow_posts),
+            'group_atom': (
+                'get', {'slug': QueryBudgetTests.group.slug},
+                reader, self.grow_posts),
+            'profile_rss': ('get', user_kwargs, reader, self.grow_posts),
+            'profile_atom': ('get', user_kwargs, reader, self.grow_posts),
+        }
+
+    def test_every_url_has_budget(self):
+        """Для каждого URL приложения есть проверка числа запросов."""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(self.get_cases()))
+
+    def test_query_count_is_constant(self):
+        for name, (method, kwargs, client, grow) in self.get_cases().items():
+            url = reverse('posts:%s' % name, kwargs=kwargs or None)
+
+            def render():
+                cache.clear()
+                response = getattr(client, method)(url, {
+                    'text': 'Комментарий', 'q': 'Пост',
+                    'comments': '1', 'images': '1',
+                })
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+            # Каждый URL проверяется на своих данных: откатываем всё,
+            # что насоздавал grow.
+            with self.subTest(url=url), transaction.atomic():
+                report = constant_queries_report(render, grow, sizes=(2, 6))
+                transaction.set_rollback(True)
+                self.assertIsNone(report, report)
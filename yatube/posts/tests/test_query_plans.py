@@ -0,0 +1,156 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post, User
+from ..timeline import HybridFeed
+
+# Полный просмотр этих таблиц ожидаем: их содержимое выводится целиком.
+ALLOWED_SCANS = {
+    # выпадающий список групп в форме поста
+    'posts_group',
+}
+
+# Ранжирование сортирует найденное по релевантности: сортировка
+# неизбежна, но сам поиск идёт по полнотекстовому индексу.
+RANKED_TABLES = {
+    'posts_search',
+}
+
+# Планы проверяются у всех запросов, которые читают таблицы.
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+
+def bad_plan_lines(sql):
+    """Строки плана с полным просмотром таблицы или сортировкой во
+    временном B-дереве."""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        details = [row[-1] for row in cursor.fetchall()]
+    ranked = any(table in sql for table in RANKED_TABLES)
+    bad = []
+    for detail in details:
+        if 'TEMP B-TREE' in detail:
+            if not ranked:
+                bad.append(detail)
+            continue
+        match = SCAN.match(detail)
+        if (
+            # строки bulk_create: INSERT ... SELECT из констант
+            match and detail != 'SCAN CONSTANT ROW'
+            and 'INDEX' not in match.group(2)
+            and match.group(1) not in ALLOWED_SCANS
+        ):
+            bad.append(detail)
+    return bad
+
+
+class QueryPlanTests(TestCase):
+    """Запросы каждого URL из posts/urls.py, в том числе UPDATE, DELETE
+    и INSERT ... SELECT, идут по индексам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='plan_author')
+        cls.other = User.objects.create_user(username='plan_other')
+        cls.reader = User.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='plan-group',
+            description='Группа для проверки планов'
+        )
+        cls.post = Post.objects.create(
+            text='Пост для проверки планов',
+            author=cls.author,
+            group=cls.group,
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(QueryPlanTests.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(QueryPlanTests.reader)
+
+    def get_cases(self):
+        """Запросы к каждому URL по порядку: (method, kwargs, client,
+        данные); подписки меняются последними."""
+        post_kwargs = {'post_id': QueryPlanTests.post.pk}
+        user_kwargs = {'username': QueryPlanTests.author.username}
+        group_kwargs = {'slug': QueryPlanTests.group.slug}
+        reader = self.reader_client
+        return {
+            'index': [('get', {}, reader, {}),
+                      ('get', {}, reader, {'page': 2})],
+            'group_list': [('get', group_kwargs, reader, {})],
+            'profile': [('get', user_kwargs, reader, {})],
+            'post_detail': [('get', post_kwargs, reader, {})],
+            'post_create': [('get', {}, reader, {})],
+            'post_edit': [('get', post_kwargs, self.author_client, {})],
+            'add_comment': [
+                ('post', post_kwargs, reader, {'text': 'Ещё комментарий'})],
+            'follow_index': [('get', {}, reader, {})],
+            'search': [('get', {}, reader, {'q': 'пост'})],
+            'profile_export': [('get', user_kwargs, reader, {
+                'comments': '1', 'images': '1'})],
+            'group_export': [('get', group_kwargs, reader, {
+                'comments': '1', 'images': '1'})],
+            'index_rss': [('get', {}, reader, {})],
+            'index_atom': [('get', {}, reader, {})],
+            'group_rss': [('get', group_kwargs, reader, {})],
+            'group_atom': [('get', group_kwargs, reader, {})],
+            'profile_rss': [('get', user_kwargs, reader, {})],
+            'profile_atom': [('get', user_kwargs, reader, {})],
+            'profile_unfollow': [('get', user_kwargs, reader, {})],
+            'profile_follow': [('get', user_kwargs, reader, {})],
+            'follow_many': [('post', {}, reader, {
+                'follow': QueryPlanTests.other.username,
+                'unfollow': QueryPlanTests.author.username,
+            })],
+        }
+
+    def assert_plans(self, method, url, client, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        for query in queries.captured_queries:
+            if not query['sql'].startswith(STATEMENTS):
+                continue
+            with self.subTest(url=url, sql=query['sql']):
+                self.assertEqual(bad_plan_lines(query['sql']), [])
+
+    def test_every_url_is_checked(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(self.get_cases()))
+
+    def test_views_use_indexes(self):
+        for name, requests in self.get_cases().items():
+            for method, kwargs, client, data in requests:
+                url = reverse('posts:%s' % name, kwargs=kwargs or None)
+                self.assert_plans(method, url, client, data)
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=1, FEED_CELEBRITY_POSTS=1)
+    def test_hybrid_feed_uses_indexes(self):
+        """Лента с популярным автором: его посты глубже кешированного
+           списка читаются из базы по автору."""
+        Post.objects.create(text='Ещё пост', author=QueryPlanTests.author)
+        url = reverse('posts:follow_index')
+        page_obj = self.reader_client.get(url).context['page_obj']
+        self.assertIsInstance(
+            page_obj.paginator.object_list, HybridFeed)
+
+        for data in ({}, {'page': page_obj.paginator.num_pages}):
+            self.assert_plans('get', url, self.reader_client, data)
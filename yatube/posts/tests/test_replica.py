@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import db
+
+from .. import versions
+from ..models import Group, Post, User
+
+LONG_AGO = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+@mock.patch.object(db, 'replica_alias', return_value=db.REPLICA)
+class ReplicaTests(TransactionTestCase):
+    """В тестах реплика — зеркало default, поэтому маршрутизация
+       включается подменой replica_alias."""
+    databases = {db.DEFAULT, db.REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='replica_author')
+        self.group = Group.objects.create(
+            title='Группа', slug='replica-group', description='Группа')
+        self.post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group)
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def get(self, url):
+        """Ответ и число запросов к default и к реплике."""
+        with CaptureQueriesContext(connections[db.DEFAULT]) as default, \
+                CaptureQueriesContext(connections[db.REPLICA]) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(default), len(replica)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=['replica-group']),
+            reverse('posts:profile', args=['replica_author']),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+
+    def test_read_views_use_replica(self, replica_alias):
+        with mock.patch.object(
+                versions, 'last_changed', return_value=LONG_AGO):
+            for url in self.urls():
+                with self.subTest(url=url):
+                    _, _, replica = self.get(url)
+                    self.assertGreater(replica, 0)
+
+    def test_recently_changed_pages_read_primary(self, replica_alias):
+        """Страница, данные которой только что изменились, не читается
+           с реплики, даже если пользователь ничего не писал."""
+        for url in self.urls():
+            with self.subTest(url=url):
+                _, _, replica = self.get(url)
+                self.assertEqual(replica, 0)
+
+    def test_writer_reads_own_writes(self, replica_alias):
+        self.client.post(reverse('posts:post_create'), {'text': 'Новый'})
+
+        with mock.patch.object(
+                versions, 'last_changed', return_value=LONG_AGO):
+            response, _, replica = self.get(
+                reverse('posts:profile', args=['replica_author']))
+
+        self.assertEqual(replica, 0)
+        self.assertContains(response, 'Новый')
+
+    def test_writes_go_to_primary(self, replica_alias):
+        with db.replica_reads():
+            post = Post.objects.get(pk=self.post.pk)
+            self.assertEqual(post._state.db, db.REPLICA)
+            post.text = 'Правка'
+            with CaptureQueriesContext(connections[db.DEFAULT]) as queries:
+                post.save(update_fields=['text'])
+
+        self.assertTrue(any(
+            query['sql'].startswith('UPDATE') for query in queries))
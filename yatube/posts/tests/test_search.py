@@ -0,0 +1,155 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='search_author')
+        cls.reader = User.objects.create_user(username='search_reader')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return response, [post.pk for post in response.context['page_obj']]
+
+    def create_post(self, text):
+        return Post.objects.create(text=text, author=SearchTests.author)
+
+    def test_finds_posts_by_text_and_comments(self):
+        """Пост находится по своему тексту и по тексту комментариев;
+           совпадение в тексте поста выше."""
+        by_comment = self.create_post('Про погоду')
+        Comment.objects.create(
+            post=by_comment, author=SearchTests.reader,
+            text='Лучше бы про котиков')
+        by_text = self.create_post('Про котиков')
+        self.create_post('Про собак')
+
+        response, found = self.search('котик')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(found, [by_text.pk, by_comment.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.create_post('Старый текст')
+        comment = Comment.objects.create(
+            post=post, author=SearchTests.reader, text='Комментарий')
+
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.search('старый')[1], [])
+        self.assertEqual(self.search('новый')[1], [post.pk])
+
+        comment.delete()
+        self.assertEqual(self.search('комментарий')[1], [])
+        post.delete()
+        self.assertEqual(self.search('новый')[1], [])
+
+    @override_settings(POSTS_COUNT=2)
+    def test_cursor_pagination(self):
+        """Страницы поиска идут по курсору без пропусков и повторов."""
+        posts = [self.create_post('Котики %s' % number) for number in range(5)]
+
+        seen, cursor = [], None
+        while True:
+            params = {'page': cursor} if cursor else {}
+            response, found = self.search('котики', **params)
+            seen += found
+            page_obj = response.context['page_obj']
+            if not page_obj.has_next():
+                break
+            cursor = page_obj.next_page_number()
+
+        self.assertEqual(sorted(seen), sorted(post.pk for post in posts))
+        self.assertEqual(len(seen), len(posts))
+        response, found = self.search(
+            'котики', page=page_obj.previous_page_number())
+        self.assertEqual(found, seen[2:4])
+
+    def test_query_syntax_is_escaped(self):
+        self.create_post('Котики')
+        for query in ('"котики', 'котики OR', '***', 'NEAR(котики'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        post = self.create_post('Котики')
+        Comment.objects.create(
+            post=post, author=SearchTests.reader, text='Котики!')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=1, stdout=out)
+
+        self.assertIn('постов 1, комментариев 1', out.getvalue())
+        self.assertEqual(self.search('котики')[1], [post.pk])
+
+    def test_rebuild_keeps_index_searchable(self):
+        """Перестроение не очищает индекс заранее: пока пачка поста не
+           дошла, он находится по старой строке; строки удалённых
+           записей исчезают."""
+        first = self.create_post('Котики первые')
+        last = self.create_post('Котики последние')
+        comment = Comment.objects.create(
+            post=first, author=SearchTests.reader, text='Собаки')
+        # строки записей, которых уже нет: между пачками и после них
+        for rowid in (2 * last.pk + 2, 2 * last.pk - 1, 2 * comment.pk + 3):
+            search._replace(rowid, 'Котики удалённые', first.pk)
+        batches = search.pk_batches
+        found = []
+
+        def checking_batches(queryset, batch_size):
+            for batch in batches(queryset, batch_size):
+                found.append(self.search('котики')[1])
+                yield batch
+
+        with mock.patch.object(search, 'pk_batches', checking_batches):
+            search.rebuild(batch_size=1)
+
+        self.assertTrue(all(last.pk in pks for pks in found))
+        self.assertEqual(sorted(self.search('котики')[1]),
+                         [first.pk, last.pk])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rowid FROM posts_search ORDER BY rowid')
+            rowids = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(
+            rowids, sorted([2 * first.pk, 2 * last.pk, 2 * comment.pk + 1]))
+
+    def test_admin_search_uses_index(self):
+        found = self.create_post('Котики в админке')
+        self.create_post('Собаки в админке')
+        admin = User.objects.create_superuser(
+            'search_admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'котики'})
+
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [found.pk],
+        )
+        self.assertFalse(any(
+            'LIKE' in query['sql'] for query in queries.captured_queries))
+        self.assertTrue(any(
+            search.TABLE in query['sql']
+            for query in queries.captured_queries))
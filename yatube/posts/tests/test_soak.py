@@ -0,0 +1,70 @@
+from django.db import OperationalError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from .. import bench, soak
+from ..models import Comment, Post
+
+
+class SoakRunTests(TransactionTestCase):
+    def test_run(self):
+        """Прогон читает и пишет без ошибок и раскладывает замеры
+           по окнам."""
+        bench.seed(users=4, groups=2, posts=20, comments=10, follows=2)
+        posts = Post.objects.count()
+        workload = soak.Workload({'index': 1, 'add_comment': 1,
+                                  'post_create': 1})
+
+        # Один поток: тестовая база в памяти с общим кешем блокирует
+        # таблицы целиком, и параллельная запись падала бы сразу.
+        report = soak.run(workload, seconds=1, threads=1, interval=0.5)
+
+        operations = report['operations']
+        self.assertEqual(set(operations),
+                         {'index', 'add_comment', 'post_create'})
+        for name, stats in operations.items():
+            with self.subTest(name=name):
+                self.assertGreater(stats['requests'], 0)
+                self.assertEqual(stats['errors'], 0)
+        self.assertEqual(Comment.objects.count(),
+                         10 + operations['add_comment']['requests'])
+        self.assertEqual(Post.objects.count(),
+                         posts + operations['post_create']['requests'])
+        self.assertGreaterEqual(len(report['timeline']), 2)
+        self.assertGreater(report['timeline'][0]['rss_mb'], 0)
+
+    def test_threads_read_concurrently(self):
+        bench.seed(users=4, groups=2, posts=20, comments=10, follows=2)
+        workload = soak.Workload({'index': 1, 'post_detail': 1})
+
+        report = soak.run(workload, seconds=1, threads=3, interval=1)
+
+        self.assertEqual(
+            sum(stats['errors'] for stats in report['operations'].values()),
+            0)
+
+
+class SoakReportTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(soak.parse_mix('index=3, add_comment=1'),
+                         {'index': 3, 'add_comment': 1})
+        with self.assertRaises(ValueError):
+            soak.parse_mix('unknown=1')
+        with self.assertRaises(ValueError):
+            soak.parse_mix('index=0')
+
+    def test_locked_errors_are_counted(self):
+        recorder = soak.Recorder(started=0, interval=10 ** 9)
+        recorder.record('add_comment', 0.5, 500,
+                        OperationalError('database is locked'))
+        recorder.record('add_comment', 0.1, 500, ValueError('boom'))
+        recorder.record('index', 0.2, 200, None)
+
+        report = soak.summarize(
+            [(recorder.windows, {0: 2 ** 20, 1: 3 * 2 ** 20})],
+            interval=1, elapsed=1)
+
+        comment = report['operations']['add_comment']
+        self.assertEqual((comment['errors'], comment['locked']), (2, 1))
+        self.assertEqual(comment['error_rate'], 1)
+        self.assertEqual(report['timeline'][0]['requests'], 3)
+        self.assertEqual(report['memory_growth_mb'], 2)
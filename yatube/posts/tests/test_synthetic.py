@@ -0,0 +1,95 @@
+import random
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+from ..synthetic import IMAGE_DIR, Generator, zipf_rank
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SIZES = {'users': 50, 'groups': 3, 'posts': 200, 'comments': 300,
+         'follows': 5}
+
+
+class ZipfTests(TestCase):
+    def test_rank_is_skewed_and_in_range(self):
+        rng = random.Random(1)
+        ranks = Counter(zipf_rank(rng, 100, 1.1) for _ in range(10000))
+
+        self.assertTrue(set(ranks) <= set(range(100)))
+        self.assertGreater(ranks[0], ranks[10] * 5)
+        self.assertEqual(zipf_rank(random.Random(1), 1, 1.1), 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class GeneratorTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def dataset(self, prefix):
+        """Набор без id и префикса, чтобы сравнивать разные запуски."""
+        users = User.objects.filter(username__startswith=prefix)
+        name = dict(users.values_list('pk', 'username'))
+        return {
+            'posts': [
+                (name[author].replace(prefix, ''), text, pub_date, image)
+                for author, text, pub_date, image in Post.objects.filter(
+                    author__in=users).order_by('pk').values_list(
+                        'author', 'text', 'pub_date', 'image')
+            ],
+            'follows': sorted(
+                (name[user].replace(prefix, ''),
+                 name[author].replace(prefix, ''))
+                for user, author in Follow.objects.filter(
+                    user__in=users).values_list('user', 'author')
+            ),
+        }
+
+    def test_generate(self):
+        counts = Generator(seed=3, prefix='a').generate(**SIZES)
+
+        self.assertEqual(counts['users'], User.objects.count())
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(counts['follows'], Follow.objects.count())
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        images = Post.objects.exclude(image='').values_list('image', flat=True)
+        self.assertTrue(images)
+        self.assertTrue(all(
+            image.startswith(f'{IMAGE_DIR}/') for image in images))
+        # у самого популярного автора постов больше, чем в среднем
+        top = Counter(Post.objects.values_list('author', flat=True))
+        self.assertGreater(top.most_common(1)[0][1], 200 / 50 * 3)
+
+    def test_same_seed_gives_same_dataset(self):
+        Generator(seed=3, prefix='a').generate(**SIZES)
+        Generator(seed=3, prefix='b').generate(**SIZES)
+        Generator(seed=4, prefix='c').generate(**SIZES)
+
+        self.assertEqual(self.dataset('a'), self.dataset('b'))
+        self.assertNotEqual(self.dataset('a'), self.dataset('c'))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('seed_data', users=20, groups=2, posts=40,
+                     comments=50, follows=3, stdout=out)
+
+        self.assertIn('Создано', out.getvalue())
+        self.assertEqual(UserStats.objects.count(), 20)
+        self.assertEqual(
+            sum(Group.objects.values_list('posts_count', flat=True)),
+            Post.objects.filter(group__isnull=False).count(),
+        )
+        with self.assertRaises(CommandError):
+            call_command('seed_data', users=20, stdout=out)
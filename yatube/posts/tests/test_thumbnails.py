@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import thumbnails
+from ..fragments import KEY, content_version
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded_gif(name='thumb.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='thumb_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ThumbnailTests.author)
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=ThumbnailTests.author,
+            image=uploaded_gif(),
+        )
+
+    def test_render_falls_back_to_original(self):
+        """Пока миниатюры нет, лента показывает исходную картинку
+           и не кеширует такую карточку."""
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            response = self.authorized_client.get(reverse('posts:index'))
+
+        enqueue.assert_called_once()
+        self.assertContains(response, self.post.image.url)
+        self.assertNotContains(response, '/media/cache/')
+        key = KEY.format(self.post.pk, content_version(self.post))
+        self.assertIsNone(cache.get(key))
+
+    def test_pregenerated_thumbnail_is_rendered(self):
+        """Подготовленная заранее миниатюра выводится в ленте."""
+        thumbnails.pregenerate(self.post.image)
+        self.assertTrue(thumbnails.is_ready(self.post.image))
+
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            response = self.authorized_client.get(reverse('posts:index'))
+
+        enqueue.assert_not_called()
+        self.assertContains(response, '/media/cache/')
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_page_thumbnails_prefetched_in_one_query(self):
+        """Миниатюры всех постов страницы читаются из key-value store
+           одним запросом."""
+        for number in range(3):
+            Post.objects.create(
+                text='Ещё пост с картинкой',
+                author=ThumbnailTests.author,
+                image=uploaded_gif('thumb_%s.gif' % number),
+            )
+        self.authorized_client.get(reverse('posts:index'))
+        # Миниатюры уже записаны в БД, кеш пуст.
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(response.content.decode().count('/media/cache/'), 4)
+
+    def test_post_create_schedules_thumbnails(self):
+        """После создания поста с картинкой миниатюры ставятся
+           в очередь после коммита."""
+        on_commit = 'posts.thumbnails.transaction.on_commit'
+        with mock.patch(on_commit, side_effect=lambda func: func()), \
+                mock.patch.object(thumbnails, 'pregenerate') as pregenerate:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Новый пост', 'image': uploaded_gif('new.gif')},
+            )
+
+        post = Post.objects.latest('pk')
+        pregenerate.assert_called_once()
+        image, scopes = pregenerate.call_args[0]
+        self.assertEqual(image.name, post.image.name)
+        self.assertIn(f'post:{post.pk}', scopes)
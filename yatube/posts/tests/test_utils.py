@@ -0,0 +1,65 @@
+from django.test import RequestFactory, TestCase
+
+from ..models import Post, User
+from ..utils import CursorPaginator, get_paginator
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='cursor_author')
+        cls.number_of_posts = 13
+        Post.objects.bulk_create(
+            Post(text='Пост %s' % i, author=cls.author)
+            for i in range(cls.number_of_posts)
+        )
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def get_page(self, page=None):
+        params = {'page': page} if page else {}
+        request = self.factory.get('/', params)
+        return get_paginator(Post.objects.all(), request, cursor=True)
+
+    def test_first_page(self):
+        """Первая страница курсорного режима не делает COUNT."""
+        with self.assertNumQueries(1):
+            page = self.get_page()
+            posts = list(page)
+
+        self.assertIsInstance(page.paginator, CursorPaginator)
+        self.assertEqual(len(posts), 10)
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_walk_forward_and_back(self):
+        """Курсоры next/prev возвращают соседние страницы без дублей."""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+        first = self.get_page()
+        second = self.get_page(first.next_page_number())
+
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+
+        back = self.get_page(second.previous_page_number())
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_last_page_and_invalid_cursor(self):
+        """Ссылка «Последняя» и мусорный курсор обрабатываются корректно."""
+        first = self.get_page('not-a-cursor')
+        last = self.get_page(first.paginator.num_pages)
+
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(last), 10)
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+        # base64 от JSON, который не список: {}, 1 и ""
+        for cursor in ('e30', 'MQ', 'IiI'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(len(self.get_page(cursor)), 10)
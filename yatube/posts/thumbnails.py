@@ -0,0 +1,220 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Тег `{% thumbnail %}` sorl создаёт миниатюру прямо во время рендера,
+и задержку Pillow платит первый читатель ленты. Здесь миниатюры всех
+размеров из THUMBNAIL_GEOMETRIES делаются в пуле потоков после коммита
+поста, а бэкенд sorl (THUMBNAIL_BACKEND) до их готовности отдаёт
+исходную картинку вместо того, чтобы резать её сам.
+
+Фоновый поток работает только с хранилищем файлов и кешем: в БД
+(key-value store sorl) миниатюру записывает уже поток запроса, увидев
+в кеше отметку о готовности.
+
+prefetch() находит миниатюры всех постов страницы одним чтением
+key-value store, чтобы теги `{% thumbnail %}` не ходили в кеш и БД
+по одному разу на пост.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+READY_KEY = 'thumbnail_ready:{}'
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Не создаёт миниатюры во время рендера: отдаёт готовую или
+    исходную картинку и ставит создание в очередь."""
+
+    def _prepare(self, file_, geometry_string, options):
+        # Имя файла миниатюры зависит от итоговых опций, поэтому
+        # дополняем их так же, как ThumbnailBackend.get_thumbnail.
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, ImageFile(name, default.storage)
+
+    def _lookup(self, file_, thumbnail):
+        # Найденное prefetch() хранится на самом посте.
+        instance = getattr(file_, 'instance', None)
+        prefetched = getattr(instance, '_thumbnails', {})
+        if thumbnail.name in prefetched:
+            return prefetched[thumbnail.name]
+        return default.kvstore.get(thumbnail)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        raw_options = dict(options)
+        source, thumbnail = self._prepare(file_, geometry_string, options)
+        cached = self._lookup(file_, thumbnail)
+        if cached:
+            return cached
+        ready_key = READY_KEY.format(thumbnail.name)
+        if not cache.get(ready_key):
+            enqueue(source.name, geometry_string, raw_options)
+            # Без пула потоков миниатюра уже готова.
+            if not cache.get(ready_key):
+                return source
+        default.kvstore.get_or_set(source)
+        default.kvstore.set(thumbnail, source)
+        return thumbnail
+
+    def is_ready(self, file_, geometry_string, **options):
+        source, thumbnail = self._prepare(file_, geometry_string, options)
+        return bool(
+            self._lookup(file_, thumbnail)
+            or cache.get(READY_KEY.format(thumbnail.name))
+        )
+
+    def generate(self, file_, geometry_string, **options):
+        """Создаёт файл миниатюры, не обращаясь к БД."""
+        source, thumbnail = self._prepare(file_, geometry_string, options)
+        if not thumbnail.exists():
+            source_image = default.engine.get_image(source)
+            options['image_info'] = default.engine.get_image_info(
+                source_image)
+            try:
+                self._create_thumbnail(
+                    source_image, geometry_string, options, thumbnail)
+                self._create_alternative_resolutions(
+                    source_image, geometry_string, options, thumbnail.name)
+            finally:
+                default.engine.cleanup(source_image)
+        cache.set(READY_KEY.format(thumbnail.name), True, None)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def _generate(name, geometry_string, options, scopes):
+    try:
+        default.backend.generate(name, geometry_string, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+    else:
+        # Ленты, закешированные с исходной картинкой, пора перерисовать.
+        if scopes:
+            versions.bump(*scopes)
+    finally:
+        with _lock:
+            _pending.discard((name, geometry_string))
+
+
+def enqueue(name, geometry_string, options, scopes=()):
+    """Ставит миниатюру в очередь, если она ещё не там.
+
+    При THUMBNAIL_WORKERS = 0 миниатюра создаётся сразу.
+    """
+    task = (name, geometry_string)
+    with _lock:
+        if task in _pending:
+            return
+        _pending.add(task)
+    if not settings.THUMBNAIL_WORKERS:
+        _generate(name, geometry_string, options, scopes)
+        return
+    _get_executor().submit(_generate, name, geometry_string, options, scopes)
+
+
+def pregenerate(image, scopes=()):
+    """Миниатюры картинки всех размеров из THUMBNAIL_GEOMETRIES."""
+    for geometry_string, options in settings.THUMBNAIL_GEOMETRIES:
+        enqueue(image.name, geometry_string, dict(options), scopes)
+
+
+def schedule(post):
+    """Готовит миниатюры картинки поста после коммита транзакции."""
+    if post.image:
+        scopes = versions.post_scopes(post, post.group_id)
+        image = post.image
+        transaction.on_commit(lambda: pregenerate(image, scopes))
+
+
+def is_ready(image):
+    return all(
+        default.backend.is_ready(image, geometry_string, **options)
+        for geometry_string, options in settings.THUMBNAIL_GEOMETRIES
+    )
+
+
+def _get_many_raw(kvstore, keys):
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        # Как и KVStore._get_raw, запоминаем в кеше и отсутствие ключа.
+        kvstore.cache.set_many(
+            {key: rows.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        found.update(rows)
+    return {
+        key: value for key, value in found.items() if value != EMPTY_VALUE
+    }
+
+
+def prefetch(posts):
+    """Миниатюры картинок постов за один get_many кеша и не больше
+    одного запроса к БД.
+
+    Найденное запоминается в посте, и бэкенд берёт миниатюру оттуда.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return posts
+    wanted = {}
+    for post in posts:
+        post._thumbnails = {}
+        if not post.image:
+            continue
+        for geometry_string, options in settings.THUMBNAIL_GEOMETRIES:
+            source, thumbnail = default.backend._prepare(
+                post.image, geometry_string, dict(options))
+            wanted[add_prefix(thumbnail.key)] = (post, thumbnail.name)
+    if not wanted:
+        return posts
+    found = _get_many_raw(kvstore, list(wanted))
+    for key, (post, name) in wanted.items():
+        value = found.get(key)
+        post._thumbnails[name] = (
+            deserialize_image_file(value) if value else None)
+    return posts
@@ -0,0 +1,260 @@
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.sqlite import chunks
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import keyset_slice, pk_batches
+
+BATCH_SIZE = 1000
+RECENT_POSTS_KEY = 'recent_posts:{}'
+RECENT_POSTS_TIMEOUT = 60 * 60
+# Ключ курсора записей ленты: pub_date в ней — дата поста.
+TIMELINE_KEY = ('pub_date', 'post_id')
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS,
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты популярных авторов не раскладываются: их подмешивает
+    `HybridFeed` при чтении ленты.
+    """
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    _insert([
+        TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    ])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора, на которого подписались."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    _insert([
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts
+    ])
+
+
+def fill(batch_size=BATCH_SIZE, author_ids=None):
+    """Дозаполняет ленты всех подписок, как `backfill`, но одним
+    INSERT на пачку подписок. Нужна после загрузки данных в обход
+    сигналов (bulk_create); уже разложенные посты не дублируются.
+    С `author_ids` — только подписки на этих авторов.
+
+    Возвращает число обработанных подписок.
+    """
+    if author_ids is None:
+        return _fill(batch_size)
+    return sum(
+        _fill(batch_size, chunk) for chunk in chunks(sorted(author_ids)))
+
+
+def _fill(batch_size, author_ids=None):
+    follows = Follow.objects.filter(user__isnull=False).order_by('pk')
+    author_filter = ''
+    params = []
+    if author_ids is not None:
+        follows = follows.filter(author_id__in=author_ids)
+        author_filter = ' AND f.author_id IN (%s)' % ', '.join(
+            ['%s'] * len(author_ids))
+        params = list(author_ids)
+    sql = (
+        'INSERT OR IGNORE INTO {timeline} (user_id, post_id, pub_date) '
+        'SELECT user_id, post_id, pub_date FROM ('
+        '  SELECT f.user_id, p.id AS post_id, p.pub_date, ROW_NUMBER() OVER ('
+        '    PARTITION BY f.id ORDER BY p.pub_date DESC, p.id DESC'
+        '  ) AS number'
+        '  FROM {follow} f JOIN {post} p ON p.author_id = f.author_id'
+        '  LEFT JOIN {stats} s ON s.user_id = f.author_id'
+        '  WHERE f.id BETWEEN %s AND %s AND f.user_id IS NOT NULL'
+        '  AND COALESCE(s.followers_count, 0) < %s{author_filter}'
+        ') WHERE number <= %s'
+    ).format(
+        timeline=TimelineEntry._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+        stats=UserStats._meta.db_table,
+        author_filter=author_filter,
+    )
+    total = 0
+    for pks in pk_batches(follows, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [
+                pks[0], pks[-1],
+                settings.FEED_CELEBRITY_FOLLOWERS,
+                *params,
+                settings.TIMELINE_BACKFILL,
+            ])
+        total += len(pks)
+    return total
+
+
+def fill_if_demoted(author_id):
+    """Если автор только что перестал быть популярным, раскладывает его
+    последние посты по лентам подписчиков: `HybridFeed` их больше не
+    подмешивает. Вызывается после уменьшения счётчика подписчиков."""
+    if UserStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_CELEBRITY_FOLLOWERS - 1,
+    ).exists():
+        # Лент много: заполняются пачками после коммита отписки.
+        transaction.on_commit(lambda: fill(author_ids=[author_id]))
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+class TimelineFeed:
+    """Лента подписок без популярных авторов: посты материализованной
+    ленты одним запросом по её индексу (user, pub_date, post). Как и
+    `HybridFeed`, поддерживает только курсорную пагинацию (`keyset`)."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def keyset(self, key, reverse, limit):
+        entries = TimelineEntry.objects.filter(user=self.user).select_related(
+            'post__author', 'post__group')
+        return [
+            entry.post for entry in
+            keyset_slice(entries, key, reverse, limit, fields=TIMELINE_KEY)
+        ]
+
+
+def forget_recent(author_id):
+    cache.delete(RECENT_POSTS_KEY.format(author_id))
+
+
+def recent_posts(author_ids):
+    """Ключи (pub_date, id) последних FEED_CELEBRITY_POSTS постов
+    авторов, от новых к старым: {автор: ключи}.
+
+    Списки читаются из кеша одним get_many, промахи добираются из базы.
+    """
+    keys = {RECENT_POSTS_KEY.format(pk): pk for pk in author_ids}
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, author_id in keys.items():
+        if key not in cached:
+            missing[key] = list(
+                Post.objects.filter(author_id=author_id).order_by(
+                    '-pub_date', '-id'
+                ).values_list('pub_date', 'id')[:settings.FEED_CELEBRITY_POSTS]
+            )
+    if missing:
+        cache.set_many(missing, RECENT_POSTS_TIMEOUT)
+        cached.update(missing)
+    return {author_id: cached[key] for key, author_id in keys.items()}
+
+
+def _author_keys(author_id, key, reverse, limit):
+    """Ключи постов автора за курсором прямо из базы."""
+    return keyset_slice(
+        Post.objects.filter(author_id=author_id).values_list('pub_date', 'id'),
+        key, reverse, limit,
+    )
+
+
+def _after(keys, key, reverse):
+    """Часть отсортированного по убыванию списка ключей за курсором."""
+    if reverse:
+        keys = keys[::-1]
+        return keys if key is None else [k for k in keys if k > key]
+    return keys if key is None else [k for k in keys if k < key]
+
+
+class HybridFeed:
+    """Лента подписок для тех, кто читает популярных авторов.
+
+    Посты обычных авторов берутся из материализованной ленты, посты
+    популярных — из их кешированных списков, а страницы глубже этих
+    списков — из базы по автору; источники сливаются
+    k-way merge по ключу (pub_date, id). Поддерживает только курсорную
+    пагинацию (`keyset`).
+    """
+
+    def __init__(self, user, celebrity_ids):
+        self.user = user
+        self.celebrity_ids = celebrity_ids
+
+    def _timeline_keys(self, key, reverse, limit):
+        return keyset_slice(
+            TimelineEntry.objects.filter(user=self.user).values_list(
+                'pub_date', 'post_id'),
+            key, reverse, limit, fields=TIMELINE_KEY,
+        )
+
+    def _celebrity_keys(self, author_id, keys, key, reverse, limit):
+        after = _after(keys, key, reverse)[:limit]
+        if len(keys) < settings.FEED_CELEBRITY_POSTS:
+            # В кеше все посты автора.
+            return after
+        # Список обрезан: за его последним ключом есть более старые
+        # посты. Глубже кеша лента читает автора из базы.
+        if reverse:
+            complete = key is not None and key >= keys[-1]
+        else:
+            complete = len(after) == limit
+        if complete:
+            return after
+        return _author_keys(author_id, key, reverse, limit)
+
+    def keyset(self, key, reverse, limit):
+        sources = [self._timeline_keys(key, reverse, limit)]
+        for author_id, keys in recent_posts(self.celebrity_ids).items():
+            sources.append(
+                self._celebrity_keys(author_id, keys, key, reverse, limit))
+
+        ids = []
+        for _, pk in heapq.merge(*sources, reverse=not reverse):
+            # Пост мог попасть в ленту до того, как автор стал популярным.
+            if pk in ids:
+                continue
+            ids.append(pk)
+            if len(ids) == limit:
+                break
+
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def follow_feed(user):
+    """Лента подписок: `TimelineFeed`, если популярных авторов среди
+    подписок нет, иначе `HybridFeed`."""
+    celebrity_ids = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=(
+            settings.FEED_CELEBRITY_FOLLOWERS
+        ),
+    ).values_list('author_id', flat=True))
+    if not celebrity_ids:
+        return TimelineFeed(user)
+    return HybridFeed(user, celebrity_ids)
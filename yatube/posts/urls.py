@@ -1,13 +1,21 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/export/',
+        views.group_export, name='group_export'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export, name='profile_export'
+    ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
@@ -16,6 +24,7 @@ urlpatterns = [
         views.add_comment, name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/many/', views.follow_many, name='follow_many'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -26,4 +35,17 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('search/', views.search, name='search'),
+    path('rss/', feeds.index_rss, name='index_rss'),
+    path('atom/', feeds.index_atom, name='index_atom'),
+    path('group/<slug:slug>/rss/', feeds.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.group_atom, name='group_atom'),
+    path(
+        'profile/<str:username>/rss/',
+        feeds.profile_rss, name='profile_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        feeds.profile_atom, name='profile_atom'
+    ),
 ]
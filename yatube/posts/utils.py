@@ -1,9 +1,257 @@
+import base64
+import json
+from datetime import datetime
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, key=None):
+    """Упаковывает направление и ключ (pub_date, id) в непрозрачную строку.
+
+    Вместо pub_date может быть число, например релевантность в поиске.
+    """
+    payload = [direction]
+    if key is not None:
+        first = key[0]
+        if hasattr(first, 'isoformat'):
+            first = first.isoformat()
+        payload += [first, key[1]]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (direction, key) или None для невалидного курсора."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode())
+        if not isinstance(payload, list):
+            return None
+        direction = payload[0]
+        key = None
+        if len(payload) == 3:
+            first = payload[1]
+            if isinstance(first, str):
+                first = parse_datetime(first)
+            elif not isinstance(first, (int, float)):
+                first = None
+            key = (first, int(payload[2]))
+            if key[0] is None:
+                return None
+    except (ValueError, TypeError, IndexError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    return direction, key
+
+
+def keyset_slice(object_list, key, reverse, limit, fields=('pub_date', 'id')):
+    """Выборка по ключу (pub_date, id) без OFFSET.
+
+    `fields` — поля ключа, если они называются иначе, например
+    (pub_date, post_id) записей ленты. Объекты, которые умеют читать
+    себя по ключу сами (например, ленты, собранные из нескольких
+    источников), предоставляют метод `keyset`.
+    """
+    if hasattr(object_list, 'keyset'):
+        return list(object_list.keyset(key, reverse, limit))
+    date, pk = fields
+    if reverse:
+        queryset = object_list.order_by(date, pk)
+        lookup = 'gt'
+    else:
+        queryset = object_list.order_by(f'-{date}', f'-{pk}')
+        lookup = 'lt'
+    if key is not None:
+        queryset = queryset.filter(
+            Q(**{f'{date}__{lookup}': key[0]})
+            | Q(**{date: key[0], f'{pk}__{lookup}': key[1]})
+        )
+    return list(queryset[:limit])
+
+
+def pk_batches(queryset, batch_size):
+    """Первичные ключи queryset по возрастанию, списками по batch_size.
+
+    Следующая пачка читается по ключу (pk больше последнего), а не
+    через OFFSET.
+    """
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        batch = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+class CursorPaginator:
+    """Пагинатор по ключу (pub_date, id): не делает COUNT и OFFSET.
+
+    Повторяет ту часть интерфейса `Paginator`, которую использует
+    шаблон `posts/includes/paginator.html`. Номера страниц заменены
+    курсорами, поэтому ссылки вида `?page=...` продолжают работать.
+    """
+
+    page_range = ()
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    @property
+    def num_pages(self):
+        # Курсор последней страницы: чтение с конца ленты без ключа.
+        return encode_cursor(PREVIOUS)
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return self.first_page()
+        direction, key = decoded
+        # Курсор чужой ленты, например поиска, считаем невалидным.
+        key_type = getattr(self.object_list, 'key_type', datetime)
+        if key is not None and not isinstance(key[0], key_type):
+            return self.first_page()
+        if direction == PREVIOUS:
+            return self.page_before(key)
+        if key is None:
+            return self.first_page()
+        return self.page_after(key)
+
+    def cursor_key(self, obj):
+        # Источник с собственным порядком (поиск) задаёт ключ сам.
+        cursor_key = getattr(self.object_list, 'cursor_key', None)
+        if cursor_key is not None:
+            return cursor_key(obj)
+        return obj.pub_date, obj.pk
+
+    def first_page(self):
+        items = keyset_slice(self.object_list, None, False, self.per_page + 1)
+        return cursor_page(
+            items[:self.per_page], self,
+            has_next=len(items) > self.per_page,
+            has_previous=False,
+        )
+
+    def page_after(self, key):
+        items = keyset_slice(self.object_list, key, False, self.per_page + 1)
+        return cursor_page(
+            items[:self.per_page], self,
+            has_next=len(items) > self.per_page,
+            has_previous=True,
+            number=encode_cursor(NEXT, key),
+        )
+
+    def page_before(self, key):
+        items = keyset_slice(self.object_list, key, True, self.per_page + 1)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page][::-1]
+        return cursor_page(
+            items, self,
+            has_next=key is not None,
+            has_previous=has_previous,
+            number=encode_cursor(PREVIOUS, key),
+        )
+
+
+def cursor_page(object_list, paginator, has_next, has_previous, number=1):
+    """Страница `CursorPaginator`.
+
+    Это обычный `Page`: его тип ожидают шаблоны и тесты страниц. Номер
+    страницы — курсор, поэтому переходы, которые `Page` вычисляет по
+    номеру, заданы у экземпляра.
+    """
+    page = Page(object_list, number, paginator)
+
+    def next_page_number():
+        if not has_next or not object_list:
+            return None
+        return encode_cursor(NEXT, paginator.cursor_key(object_list[-1]))
+
+    def previous_page_number():
+        if not has_previous or not object_list:
+            return None
+        return encode_cursor(PREVIOUS, paginator.cursor_key(object_list[0]))
+
+    page.has_next = lambda: has_next
+    page.has_previous = lambda: has_previous
+    page.next_page_number = next_page_number
+    page.previous_page_number = previous_page_number
+    return page
+
+
+def estimate_count(queryset):
+    """Примерное число строк таблицы модели без COUNT(*).
+
+    Берётся из статистики ANALYZE (sqlite_stat1), а без неё — по
+    максимальному первичному ключу.
+    """
+    table = queryset.model._meta.db_table
+    try:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table],
+            )
+            row = cursor.fetchone()
+        if row:
+            return int(row[0].split()[0])
+    except DatabaseError:
+        pass
+    return queryset.model._default_manager.using(queryset.db).aggregate(
+        last=Max('pk'))['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки: для большой таблицы без фильтров не считает
+    строки точно, а берёт оценку (`estimate_count`)."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is None or queryset.query.where:
+            return super().count
+        estimate = estimate_count(queryset)
+        if estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class CountedPaginator(Paginator):
+    """Пагинатор с известным заранее числом объектов, например из
+    счётчика `posts_count`: не делает COUNT(*)."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
 
+def get_paginator(data, request, cursor=False, count=None):
+    """Страница `data` по параметру `page`.
 
-def get_paginator(data, request):
-    paginator = Paginator(data, settings.POSTS_COUNT)
+    `count` — число объектов из счётчика, если оно уже известно.
+    """
     page_number = request.GET.get('page')
+    if cursor:
+        return CursorPaginator(data, settings.POSTS_COUNT).get_page(
+            page_number
+        )
+    if count is not None:
+        paginator = CountedPaginator(data, settings.POSTS_COUNT, count)
+    else:
+        paginator = Paginator(data, settings.POSTS_COUNT)
     posts = paginator.get_page(page_number)
     return posts
@@ -0,0 +1,80 @@
+"""Счётчики поколений для ключей фрагментного кеша.
+
+Вместо очистки кеша при изменении данных меняется версия области
+(`posts`, `group:<id>`, `author:<id>` и т. д.). Версия входит в ключ
+`{% cache %}`, поэтому старые фрагменты просто перестают читаться и
+со временем вытесняются, а TTL можно держать большим.
+
+Версия — не счётчик, а время со случайным хвостом: incr файлового
+кеша не атомарен, и два процесса, одновременно увеличившие 5, оба
+записали бы 6 — второй сброс потерялся бы. Новая версия каждого
+сброса уникальна и без атомарных операций.
+"""
+import secrets
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+KEY = 'version:{}'
+CHANGED_KEY = 'changed:{}'
+
+
+def _new_version():
+    # Если ключ версии вытеснен, новая версия тоже не совпадёт со старыми.
+    return f'{int(time.time() * 1000):x}-{secrets.token_hex(4)}'
+
+
+def _change(scopes):
+    now = time.time()
+    changes = {KEY.format(scope): _new_version() for scope in scopes}
+    changes.update({CHANGED_KEY.format(scope): now for scope in scopes})
+    cache.set_many(changes, None)
+
+
+def bump(*scopes):
+    _change(scopes)
+    # Фрагмент, отрендеренный до коммита по старым данным, мог попасть
+    # в кеш уже с новой версией: после коммита сбрасываем ещё раз.
+    # Вне транзакции (например, из фонового потока) повторять нечего,
+    # а on_commit открыл бы потоку лишнее соединение с БД.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _change(scopes))
+
+
+def post_scopes(post, *group_ids):
+    """Области, в лентах которых выводится пост."""
+    scopes = ['posts', f'author:{post.author_id}', f'post:{post.pk}']
+    scopes += [f'group:{pk}' for pk in group_ids if pk is not None]
+    return scopes
+
+
+def current(*scopes):
+    """Версии областей одной строкой для ключа кеша."""
+    keys = [KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def last_changed(*scopes):
+    """Время последнего изменения областей для Last-Modified.
+
+    Если время вытеснено из кеша, считаем, что изменения были только что:
+    так клиент не получит 304 для устаревшей страницы.
+    """
+    keys = [CHANGED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, None)
+        found.update(cache.get_many(missing))
+    return datetime.fromtimestamp(
+        int(max(found.values())), tz=timezone.utc)
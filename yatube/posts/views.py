@@ -1,11 +1,64 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from core.db import stick_to_primary, use_replica
+from core.sqlite import retry_on_busy
 
+from . import thumbnails, versions
+from .conditional import conditional_page
+from .exporter import FORMATS, export_lines, export_records
+from .follow_graph import graph
+from .counters import user_posts_count
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .search import SearchResults
+from .timeline import follow_feed
 from .utils import get_paginator
 
+# Сколько авторов можно передать в follow_many за один запрос.
+MAX_FOLLOWS = 100
+# Значения параметра-флага, которые его включают.
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+
+
+def _index_scopes(request):
+    return ['posts', 'groups']
+
+
+def _group_scopes(request, slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    return None if pk is None else [f'group:{pk}']
+
+
+def _profile_scopes(request, username):
+    pk = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    # число подписчиков и подписок автора
+    scopes = [f'author:{pk}', 'groups', f'followers:{pk}', f'follows:{pk}']
+    if request.user.is_authenticated:
+        # кнопка «Подписаться» / «Отписаться»
+        scopes.append(f'follows:{request.user.pk}')
+    return scopes
+
+
+def _post_scopes(request, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None
+    # счётчик постов автора и название группы тоже на странице
+    return [f'post:{post_id}', f'author:{author_id}', 'groups']
 
+
+@conditional_page(_index_scopes)
+@use_replica
 def index(request):
     title = 'Последние обновления на сайте'
     post_list = Post.objects.select_related('author', 'group')
@@ -14,48 +67,65 @@ def index(request):
 
     context = {
         'page_obj': posts,
-        'title': title
+        'title': title,
+        'cache_version': versions.current('posts', 'groups'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(_group_scopes)
+@use_replica
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related('author')
 
-    posts = get_paginator(post_list, request)
+    posts = get_paginator(post_list, request, count=group.posts_count)
 
     context = {
         'group': group,
         'page_obj': posts,
+        'cache_version': versions.current(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(_profile_scopes)
+@use_replica
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
+    user = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    post_list = user.posts.select_related('group')
+    posts_count = user_posts_count(user)
 
-    posts = get_paginator(post_list, request)
+    posts = get_paginator(post_list, request, count=posts_count)
 
     following = False
     if request.user.is_authenticated:
-        following = user.following.filter(user=request.user).exists()
+        following = graph.follows(request.user.pk, user.pk)
 
     context = {
         'author': user,
         'page_obj': posts,
         'following': following,
-        'user_posts_count': post_list.count
+        'followers_count': graph.followers_count(user.pk),
+        'following_count': graph.following_count(user.pk),
+        'user_posts_count': posts_count,
+        'cache_version': versions.current(f'author:{user.pk}', 'groups'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(_post_scopes)
+@use_replica
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author = post.author
-    author_posts_count = author.posts.count()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+    author_posts_count = user_posts_count(post.author)
+    comments = post.comments.select_related('author')
     comments_form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -67,6 +137,9 @@ def post_detail(request, post_id):
 
 
 @login_required
+@stick_to_primary
+@retry_on_busy
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -74,7 +147,7 @@ def post_create(request):
     )
     if form.is_valid():
         form.instance.author = request.user
-        form.save()
+        thumbnails.schedule(form.save())
         return redirect('posts:profile', username=request.user)
     context = {
         'form': form,
@@ -84,6 +157,9 @@ def post_create(request):
 
 
 @login_required
+@stick_to_primary
+@retry_on_busy
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -94,7 +170,11 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        post.save()
+        # Счётчики обновляются сигналами отдельными UPDATE,
+        # поэтому сохраняем только поля формы.
+        post.save(update_fields=PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -105,6 +185,9 @@ def post_edit(request, post_id):
 
 
 @login_required
+@stick_to_primary
+@retry_on_busy
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -119,30 +202,107 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     title = 'Подписки на авторов'
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator(posts, request)
+    posts = follow_feed(request.user)
+    page_obj = get_paginator(posts, request, cursor=True)
     context = {
         'page_obj': page_obj,
-        'title': title
+        'title': title,
+        'cache_version': versions.current(
+            'posts', 'groups', f'follows:{request.user.pk}'
+        ),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@stick_to_primary
+@retry_on_busy
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    is_follow_exists = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if author != request.user and not is_follow_exists:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    Follow.objects.follow(request.user, [author_id])
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@stick_to_primary
+@retry_on_busy
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    user_follows = get_object_or_404(Follow, user=request.user, author=author)
-    user_follows.delete()
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    Follow.objects.unfollow(request.user, [author_id])
     return redirect('posts:profile', username=username)
+
+
+@require_POST
+@login_required
+@stick_to_primary
+@retry_on_busy
+@transaction.atomic
+def follow_many(request):
+    """Подписки и отписки пачкой, например при первом входе: поля
+    follow и unfollow — имена авторов, можно по нескольку."""
+    follow = request.POST.getlist('follow')
+    unfollow = request.POST.getlist('unfollow')
+    if len(follow) + len(unfollow) > MAX_FOLLOWS:
+        return HttpResponseBadRequest(
+            f'Не больше {MAX_FOLLOWS} авторов за раз.')
+    ids = dict(User.objects.filter(
+        username__in=follow + unfollow).values_list('username', 'pk'))
+    Follow.objects.follow(
+        request.user, [ids[name] for name in follow if name in ids])
+    Follow.objects.unfollow(
+        request.user, [ids[name] for name in unfollow if name in ids])
+    return redirect('posts:follow_index')
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = SearchResults(query)
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'page_obj': get_paginator(results, request, cursor=True),
+        # ссылки пагинатора не должны терять запрос
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def _flag(request, name):
+    """Параметр-флаг вроде ?comments=1: ?comments=0 — выключен."""
+    return request.GET.get(name, '').lower() in TRUE_VALUES
+
+
+def _export(request, posts, name):
+    fmt = request.GET.get('format')
+    if fmt not in FORMATS:
+        fmt = 'ndjson'
+    content_type, extension = FORMATS[fmt]
+    records = export_records(
+        posts.order_by('-pub_date', '-id'),
+        comments=_flag(request, 'comments'),
+        image_url=(
+            request.build_absolute_uri if _flag(request, 'images') else None
+        ),
+    )
+    response = StreamingHttpResponse(
+        export_lines(records, fmt),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{extension}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    return _export(request, author.posts.all(), f'posts-{author.username}')
+
+
+@login_required
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _export(request, group.posts.all(), f'group-{group.slug}')
@@ -11,12 +11,27 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 POSTS_COUNT = 10
 
+# сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = 1000
+# посты авторов с таким числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении из кешированного списка последних постов
+FEED_CELEBRITY_FOLLOWERS = 10000
+FEED_CELEBRITY_POSTS = 200
+
+# сколько записей отдают RSS и Atom; XML сбрасывается версиями
+SYNDICATION_ITEMS = 20
+SYNDICATION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# до скольких строк админка считает записи точно, а не оценивает
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
@@ -82,6 +97,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.fragment_cache',
             ],
         },
     },
@@ -98,7 +114,32 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     },
+    # Реплика для view с core.db.use_replica. Пока это тот же файл,
+    # чтения идут в default; для проверки укажите копию, например
+    # db-replica.sqlite3, и обновляйте её `manage.py sync_replica`.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# PRAGMA для каждого нового соединения с SQLite (core.sqlite):
+# в WAL читатели не блокируются писателем
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    # отрицательное значение — размер в КиБ
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
+# сколько раз повторить пишущий view, если база занята
+SQLITE_BUSY_RETRIES = 5
+# на сколько секунд реплика может отставать: столько после записи
+# пользователь и изменённые страницы читают из default
+REPLICA_LAG = 10
 
 
 # Password validation
@@ -154,8 +195,41 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# L1 в памяти процесса поверх общего для процессов L2 (core.cache);
+# файлы кеша лежат вне репозитория, каталог задаётся YATUBE_CACHE_DIR
+CACHE_DIR = os.environ.get(
+    'YATUBE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'yatube-cache'))
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'CHANNEL': os.path.join(CACHE_DIR, 'invalidations.log'),
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'shared'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
+
+# тесты работают со своим кешем во временном каталоге (core.testing)
+TEST_RUNNER = 'core.testing.IsolatedCacheRunner'
+
+# фрагменты лент сбрасываются версиями (posts.versions), а не по времени
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# миниатюры картинок постов готовятся в фоне (posts.thumbnails);
+# размеры должны совпадать с тегами {% thumbnail %} в шаблонах
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# 0 — создавать миниатюры сразу после коммита, без пула потоков
+THUMBNAIL_WORKERS = 2
@@ -24,6 +24,7 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
 ]
 
 handler500 = 'core.views.server_error'